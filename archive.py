@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+   
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+   
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+   
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+   
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, io, re, posixpath, threading
+
+class Archive():
+	"""Read-only access to plugin files inside .jar, .zip and tar archives.
+	
+	A file inside an archive is addressed as '<archive>!/<member>', so the
+	finders and parsers can pass it around like an ordinary path. The static
+	helpers accept both kinds of paths. Members are read into memory on
+	demand and the archive itself is never extracted.
+	"""
+	SEPARATOR = '!'
+	EXTENSIONS = ('.jar', '.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2')
+	_RE_PATH = re.compile(r'^(.+?(?:%s))!(?:/(.*))?$' % '|'.join(re.escape(e) for e in EXTENSIONS), re.IGNORECASE)
+	_opened = {}
+	_opened_lock = threading.Lock()
+	
+	def __init__(self, archive_file):
+		self.archive_file = archive_file
+		self._lock = threading.Lock()
+		self._files = {}
+		self._dirs = {'': []}
+		# imported here, plain directory paths never pay for zipfile and tarfile
+		import tarfile, zipfile
+		if zipfile.is_zipfile(archive_file):
+			self._zip = zipfile.ZipFile(archive_file)
+			self._tar = None
+			members = [(i.filename, i) for i in self._zip.infolist() if not i.filename.endswith('/')]
+		else:
+			self._zip = None
+			self._tar = tarfile.open(archive_file, 'r:*')
+			members = [(m.name, m) for m in self._tar.getmembers() if m.isfile()]
+		for name, member in members:
+			name = posixpath.normpath(name.lstrip('/'))
+			if name in self._files: continue
+			self._files[name] = member
+			self._add(name)
+	
+	def _add(self, name):
+		parent, base = posixpath.split(name)
+		children = self._dirs.get(parent)
+		if children is None:
+			children = self._dirs[parent] = []
+			self._add(parent)
+		children.append(base)
+	
+	def read(self, member):
+		info = self._files[member]
+		with self._lock:
+			if self._zip is not None:
+				return self._zip.read(info)
+			f = self._tar.extractfile(info)
+			try:
+				return f.read()
+			finally:
+				f.close()
+	
+	@staticmethod
+	def is_archive(path):
+		return path.lower().endswith(Archive.EXTENSIONS) and os.path.isfile(path)
+	
+	@staticmethod
+	def split(path):
+		"""Returns (archive_file, member) for archive paths and (None, path) otherwise."""
+		mx = Archive._RE_PATH.match(path)
+		if mx is None or not os.path.isfile(mx.group(1)):
+			return None, path
+		member = posixpath.normpath(mx.group(2) or '')
+		return mx.group(1), '' if member == '.' else member
+	
+	@staticmethod
+	def join(archive_file, member):
+		if not member:
+			return archive_file + Archive.SEPARATOR
+		return archive_file + Archive.SEPARATOR + '/' + member
+	
+	@staticmethod
+	def get(archive_file):
+		archive_file = os.path.realpath(archive_file)
+		st = os.stat(archive_file)
+		with Archive._opened_lock:
+			signature, archive = Archive._opened.get(archive_file, (None, None))
+			if signature != (st.st_mtime, st.st_size):
+				archive = Archive(archive_file)
+				Archive._opened[archive_file] = ((st.st_mtime, st.st_size), archive)
+			return archive
+	
+	@staticmethod
+	def find_dir(archive_file, file_names, suffix = ''):
+		"""Archive path of the directory containing all file_names.
+		
+		Directories ending with suffix are preferred, then the least nested.
+		"""
+		archive = Archive.get(archive_file)
+		found = []
+		for member_dir in archive._dirs:
+			if all(posixpath.join(member_dir, fn) in archive._files for fn in file_names):
+				found.append((not member_dir.endswith(suffix), member_dir.count('/'), member_dir))
+		if len(found) == 0:
+			return None
+		return Archive.join(archive_file, min(found)[2])
+	
+	@staticmethod
+	def isfile(path):
+		archive_file, member = Archive.split(path)
+		if archive_file is None:
+			return os.path.isfile(path)
+		return member in Archive.get(archive_file)._files
+	
+	@staticmethod
+	def isdir(path):
+		archive_file, member = Archive.split(path)
+		if archive_file is None:
+			return os.path.isdir(path)
+		return member in Archive.get(archive_file)._dirs
+	
+	@staticmethod
+	def listdir(path):
+		"""Lists a directory; archive directories are listed in archive order."""
+		archive_file, member = Archive.split(path)
+		if archive_file is None:
+			return os.listdir(path)
+		return list(Archive.get(archive_file)._dirs.get(member, []))
+	
+	@staticmethod
+	def is_member(path):
+		return Archive.split(path)[0] is not None
+	
+	@staticmethod
+	def open(path, mode = 'r'):
+		archive_file, member = Archive.split(path)
+		if archive_file is None:
+			return open(path, mode)
+		archive = Archive.get(archive_file)
+		if not member in archive._files:
+			raise IOError('"%s" does not exist' % path)
+		data = io.BytesIO(archive.read(member))
+		if 'b' in mode or sys.version_info[0] < 3:
+			return data
+		return io.TextIOWrapper(data)
+	
+	@staticmethod
+	def get_source(path):
+		"""Returns path itself for plain files and a file object for archive members, for lxml."""
+		if not Archive.is_member(path):
+			return path
+		return Archive.open(path, 'rb')
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, subprocess, argparse
+from collections import OrderedDict
+
+CASES = OrderedDict()
+
+class SkipCase(Exception):
+	pass
+
+def case(func):
+	CASES[func.__name__] = func
+	return func
+
+class _Devnull():
+	"""Swaps sys.stdout for os.devnull while CLI output functions run."""
+	def __enter__(self):
+		self.stdout = sys.stdout
+		sys.stdout = open(os.devnull, 'w')
+		return self
+	
+	def __exit__(self, exc_type, exc_value, exc_tb):
+		sys.stdout.close()
+		sys.stdout = self.stdout
+
+def _repo_file(name):
+	return os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), name)
+
+def _load_fb_rules():
+	path = _repo_file('fb.rules.py')
+	if sys.version_info[0] > 2:
+		import importlib.util
+		spec = importlib.util.spec_from_file_location('fb_rules', path)
+		module = importlib.util.module_from_spec(spec)
+		spec.loader.exec_module(module)
+		return module
+	import imp
+	return imp.load_source('fb_rules', path)
+
+def _load_fb2sq():
+	try:
+		import fb2sq
+	except SyntaxError:
+		raise SkipCase('fb2sq requires Python 2')
+	return fb2sq
+
+def _load_rankers(plugin):
+	from fb import FindBugsPlugin
+	rankers = [FindBugsPlugin.BugRanker.parse(plugin.etc_dir)]
+	rankers.extend(FindBugsPlugin.BugRanker.parse(d) for d in plugin.rank_dirs)
+	return rankers
+
+def _sized_plugin(plugin, work_dir, patterns):
+	"""A plugin of the same flavour with a fixed pattern count, generated once per work directory.
+	
+	It is written by a separate process, so the generator does not count towards peak RSS.
+	"""
+	from benchmark.generate import SyntheticPlugin
+	root = os.path.join(os.path.dirname(work_dir), '%s-n%d-r0-s1' % (plugin.plugin, patterns))
+	sized = SyntheticPlugin(root, patterns, plugin.plugin)
+	if not os.path.isfile(sized.data_file):
+		subprocess.check_call([sys.executable, '-m', 'benchmark.generate', root, '-n', str(patterns), '-p', plugin.plugin],
+		                      cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+	return sized
+
+@case
+def fb_parse(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	benchmark(FindBugsPlugin.parse, plugin.etc_dir)
+
+@case
+def fb_parse_stream(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	benchmark(FindBugsPlugin.parse, plugin.etc_dir, stream=True)
+
+@case
+def fb_parse_cached(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	from cache import ParseCache
+	cache = ParseCache(os.path.join(work_dir, 'cache'))
+	FindBugsPlugin.parse(plugin.etc_dir, cache=cache)
+	benchmark(FindBugsPlugin.parse, plugin.etc_dir, cache=cache)
+
+def _fb_parse_scaling(patterns):
+	"""Registers fb_parse_<N>k, parsing a plugin of N thousand patterns whatever -n is."""
+	def fb_parse_scaling(plugin, benchmark, work_dir):
+		from fb import FindBugsPlugin
+		sized = _sized_plugin(plugin, work_dir, patterns)
+		benchmark(FindBugsPlugin.parse, sized.etc_dir)
+		benchmark.extra_info['patterns'] = patterns
+		benchmark.extra_info['us_per_pattern'] = min(benchmark.times) * 1e6 / patterns
+	fb_parse_scaling.__name__ = 'fb_parse_%dk' % (patterns // 1000)
+	return case(fb_parse_scaling)
+
+for _patterns in (1000, 10000, 50000):
+	_fb_parse_scaling(_patterns)
+
+@case
+def fb_details(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	def setup():
+		return (FindBugsPlugin.parse(plugin.etc_dir),), {}
+	def load_details(fb_plugin):
+		return [p.details for p in fb_plugin.patterns.values()]
+	benchmark.pedantic(load_details, setup=setup)
+
+@case
+def model_memory_100k(plugin, benchmark, work_dir):
+	"""Holds 100k BugPattern and 100k Rule objects built without XML; peak_rss_kb is the figure to watch."""
+	from fb import FindBugsPlugin
+	from sq import SonarQube
+	from benchmark.generate import SyntheticPlugin
+	from benchmark.run import get_peak_rss
+	names = SyntheticPlugin(work_dir, 100000, plugin.plugin).names
+	categories = SyntheticPlugin.CATEGORIES
+	def build():
+		patterns = [FindBugsPlugin.BugPattern(name, name.split('_')[0], categories[i % len(categories)], False,
+		                                      'Short %s' % name, 'Long %s' % name, None, 0) for i, name in enumerate(names)]
+		rules = [SonarQube.Rule(name, 'FB_%s' % name, 'MAJOR', 'READY', 'SINGLE', 'Name %s' % name, None) for name in names]
+		return patterns, rules
+	benchmark.extra_info['rss_before_kb'] = get_peak_rss()
+	# one round: a second one would still hold the first round's objects
+	benchmark.pedantic(build, rounds=1)
+
+@case
+def sq_rules_parse(plugin, benchmark, work_dir):
+	from sq import SonarQube
+	benchmark(SonarQube.Rules.parse, plugin.rules_xml, plugin.properties_file, plugin.html_dir)
+
+@case
+def sq_rules_parse_stream(plugin, benchmark, work_dir):
+	from sq import SonarQube
+	benchmark(SonarQube.Rules.parse, plugin.rules_xml, plugin.properties_file, plugin.html_dir, stream=True)
+
+@case
+def sq_rules_html(plugin, benchmark, work_dir):
+	from sq import SonarQube
+	def setup():
+		return (SonarQube.Rules.parse(plugin.rules_xml), plugin.html_dir), {}
+	benchmark.pedantic(SonarQube.Rules._parse_html, setup=setup)
+
+@case
+def sq_profile_parse(plugin, benchmark, work_dir):
+	from sq import SonarQube
+	benchmark(SonarQube.RulesProfile.parse, plugin.profile_xml)
+
+@case
+def catalog_load(plugin, benchmark, work_dir):
+	from catalog import RuleCatalog
+	catalog = RuleCatalog(os.path.join(work_dir, 'catalog.db'))
+	catalog.import_plugin(plugin.etc_dir)
+	catalog.import_rules(plugin.rules_xml, plugin.properties_file, plugin.html_dir)
+	def load():
+		return catalog.load_plugin(plugin.etc_dir), catalog.load_rules(plugin.rules_xml)
+	benchmark(load)
+
+@case
+def text_clean(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	from textutils import TextUtils
+	texts = []
+	for p in FindBugsPlugin.parse(plugin.etc_dir).patterns.values():
+		texts.extend([p.short_desc, p.long_desc, p.details])
+	def clean():
+		return [TextUtils.get_clean(text) for text in texts]
+	benchmark(clean)
+
+def _pathological_texts(size = 1 << 20):
+	"""1 MB descriptions shaped to make backtracking or per-line work explode."""
+	def fill(unit):
+		return (unit * (size // len(unit) + 1))[:size]
+	return [
+		fill(' \t'),
+		fill(' \t')[:-2] + '\nx',
+		fill('\t' * 64 + 'x \t\n'),
+		fill('\t\t\t\n'),
+		fill(' \n\t\r\x0b'),
+		fill('<p>\t\t\tword  word\t</p>\n')
+	]
+
+@case
+def text_pathological(plugin, benchmark, work_dir):
+	from textutils import TextUtils
+	texts = _pathological_texts()
+	def normalize():
+		return [(TextUtils.get_clean(text), TextUtils.dedent(TextUtils.strip_trailing(text))) for text in texts]
+	benchmark(normalize)
+
+@case
+def rank_pattern(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	patterns = FindBugsPlugin.parse(plugin.etc_dir).patterns.values()
+	rankers = _load_rankers(plugin)
+	def rank():
+		return [FindBugsPlugin.BugRanker.rank_pattern(p, rankers) for p in patterns]
+	benchmark(rank)
+
+@case
+def rank_merged(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	patterns = FindBugsPlugin.parse(plugin.etc_dir).patterns.values()
+	rankers = _load_rankers(plugin)
+	def rank():
+		return FindBugsPlugin.BugRanker.merge(rankers).rank_all(patterns)
+	benchmark(rank)
+
+@case
+def rules_list(plugin, benchmark, work_dir):
+	from fb import FindBugsPlugin
+	from sq import SonarQube
+	fb_rules = _load_fb_rules()
+	fb_plugin = FindBugsPlugin.parse(plugin.etc_dir)
+	sq_rules = SonarQube.Rules.parse(plugin.rules_xml)
+	rankers = _load_rankers(plugin)
+	with _Devnull():
+		benchmark(fb_rules.output, fb_plugin.patterns, rankers, sq_rules)
+
+@case
+def rules_extract(plugin, benchmark, work_dir):
+	fb_rules = _load_fb_rules()
+	with _Devnull():
+		benchmark(fb_rules.extract, plugin.etc_dir, plugin.sonar_dir)
+
+def _parse_rules(plugin, benchmark, work_dir, html = False, tidy = False, jobs = 1):
+	fb2sq = _load_fb2sq()
+	if tidy:
+		try:
+			fb2sq.load_tidy()('<p></p>')
+		except (ImportError, OSError):
+			raise SkipCase('tidylib is not available')
+	args = argparse.Namespace(html=html, tidy=tidy, stream=False, cache_dir=None, cache_size=64,
+	                          exclude=None, comment=None, incremental=False, jobs=jobs, db=None)
+	converter = fb2sq.Converter(args, os.path.join(work_dir, 'build'))
+	def setup():
+		return converter.init(plugin.data_file, plugin.etc_dir), {}
+	with _Devnull():
+		benchmark.pedantic(converter.parse_rules, setup=setup)
+
+@case
+def fb2sq_parse_rules(plugin, benchmark, work_dir):
+	_parse_rules(plugin, benchmark, work_dir)
+
+@case
+def fb2sq_parse_rules_html(plugin, benchmark, work_dir):
+	_parse_rules(plugin, benchmark, work_dir, html=True)
+
+@case
+def fb2sq_parse_rules_html_tidy(plugin, benchmark, work_dir):
+	_parse_rules(plugin, benchmark, work_dir, html=True, tidy=True)
+
+@case
+def fb2sq_parse_rules_html_tidy_jobs(plugin, benchmark, work_dir):
+	"""Tidy bound rendering in 4 processes, with the serial run of the same inputs for the speedup."""
+	import multiprocessing
+	serial = benchmark.__class__(benchmark.rounds)
+	_parse_rules(plugin, serial, work_dir, html=True, tidy=True)
+	_parse_rules(plugin, benchmark, work_dir, html=True, tidy=True, jobs=4)
+	benchmark.extra_info['cpus'] = multiprocessing.cpu_count()
+	benchmark.extra_info['serial_min'] = min(serial.times)
+	benchmark.extra_info['speedup'] = min(serial.times) / min(benchmark.times)
+
+# runs a tool like "python script args" and reports the time spent in top-level imports, like -X importtime
+_IMPORT_TIMER = """
+import os, sys, time, runpy
+try:
+	import builtins
+except ImportError:
+	import __builtin__ as builtins
+spent = [0.0, 0]
+real_import = builtins.__import__
+def timed_import(*args, **kwargs):
+	if spent[1]:
+		return real_import(*args, **kwargs)
+	spent[1] = 1
+	started = time.time()
+	try:
+		return real_import(*args, **kwargs)
+	finally:
+		spent[0] += time.time() - started
+		spent[1] = 0
+builtins.__import__ = timed_import
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(os.path.realpath(sys.argv[0])))
+code = 0
+try:
+	runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit as e:
+	code = e.code
+sys.stderr.write('import_time=%f\\n' % spent[0])
+sys.exit(code)
+"""
+
+def _startup_plugin(plugin, work_dir):
+	"""A 20 pattern plugin, so cold start timings are not dominated by parsing."""
+	from benchmark.generate import SyntheticPlugin
+	return SyntheticPlugin(os.path.join(work_dir, 'startup'), 20, plugin.plugin).write()
+
+def _startup(benchmark, script, *args):
+	cmd = [sys.executable, '-c', _IMPORT_TIMER, _repo_file(script)] + list(args)
+	import_times = []
+	def run():
+		proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		stderr = proc.communicate()[1].decode('utf-8')
+		if proc.returncode != 0:
+			raise SkipCase('%s %s does not run' % (script, ' '.join(args[:1])))
+		import_times.append(float(stderr.strip().splitlines()[-1].split('=')[1]))
+	run()
+	benchmark(run)
+	benchmark.extra_info['import_min'] = min(import_times)
+
+@case
+def startup_fb2sq(plugin, benchmark, work_dir):
+	_startup(benchmark, 'fb2sq.py', '--help')
+
+@case
+def startup_fb_rules(plugin, benchmark, work_dir):
+	_startup(benchmark, 'fb.rules.py', '--help')
+
+@case
+def startup_rules_list(plugin, benchmark, work_dir):
+	small = _startup_plugin(plugin, work_dir)
+	_startup(benchmark, 'fb.rules.py', 'list', small.etc_dir, '-s', small.sonar_dir)
+
+@case
+def startup_rules_extract(plugin, benchmark, work_dir):
+	small = _startup_plugin(plugin, work_dir)
+	_startup(benchmark, 'fb.rules.py', 'extract', small.etc_dir, small.sonar_dir)
+
+@case
+def startup_fb2sq_convert(plugin, benchmark, work_dir):
+	small = _startup_plugin(plugin, work_dir)
+	_startup(benchmark, 'fb2sq.py', '--html', '-a', os.path.join(work_dir, 'rules.jar'), small.data_file, small.etc_dir)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, random, argparse
+
+class SyntheticPlugin():
+	"""Writes a synthetic FindBugs plugin and SonarQube FindBugs plugin tree.
+	
+	The layout mirrors the real checkouts so that the finders used by
+	fb.rules.py and fb2sq.py work unchanged:
+		
+		<root>/findbugs/etc/          findbugs.xml, messages.xml, bugrank.txt
+		<root>/sonar/                 pom.xml, rules, profile, l10n properties and html
+		<root>/ranks/rank-NN/         additional bugrank.txt files
+		<root>/rules.dat              fb2sq data file
+	"""
+	PLUGIN_IDS = {
+		'core': 'edu.umd.cs.findbugs.plugins.core',
+		'fbcontrib': 'com.mebigfatguy.fbcontrib',
+		'findsecbugs': 'com.h3xstream.findsecbugs'
+	}
+	CATEGORIES = ['BAD_PRACTICE', 'CORRECTNESS', 'MT_CORRECTNESS', 'I18N', 'EXPERIMENTAL', 'MALICIOUS_CODE', 'PERFORMANCE', 'SECURITY', 'STYLE']
+	PRIORITIES = ['BLOCKER', 'CRITICAL', 'MAJOR', 'MAJOR', 'MINOR', 'MINOR', 'INFO']
+	WORDS = ['method', 'field', 'class', 'value', 'null', 'reference', 'stream', 'lock', 'call', 'return',
+	         'may', 'be', 'ignored', 'never', 'always', 'unchecked', 'synchronized', 'static', 'instance', 'comparison']
+	
+	def __init__(self, root, patterns = 1000, plugin = 'core', rankers = 0, seed = 1):
+		if plugin not in self.PLUGIN_IDS:
+			raise Exception('unknown plugin: %s' % plugin)
+		self.root = os.path.realpath(root)
+		self.count = patterns
+		self.plugin = plugin
+		self.rankers = rankers
+		self.rnd = random.Random(seed)
+		self.names = ['%s_%s_%d' % (self._word().upper(), self._word().upper(), i) for i in range(patterns)]
+		self.codes = ['C%d' % i for i in range(max(1, patterns // 5))]
+		self.experimental = set(name for name in self.names if self.rnd.random() < 0.05)
+		self.deprecated = set(name for name in self.names if name not in self.experimental and self.rnd.random() < 0.03)
+	
+	@property
+	def etc_dir(self):
+		return os.path.join(self.root, 'findbugs', 'etc')
+	
+	@property
+	def sonar_dir(self):
+		return os.path.join(self.root, 'sonar')
+	
+	@property
+	def rules_dir(self):
+		return os.path.join(self.sonar_dir, 'src', 'main', 'resources', 'org', 'sonar', 'plugins', 'findbugs')
+	
+	@property
+	def l10n_dir(self):
+		return os.path.join(self.sonar_dir, 'src', 'main', 'resources', 'org', 'sonar', 'l10n')
+	
+	@property
+	def html_dir(self):
+		return os.path.join(self.l10n_dir, 'findbugs', 'rules', 'findbugs')
+	
+	@property
+	def rules_xml(self):
+		name = 'rules.xml' if self.plugin == 'core' else 'rules-%s.xml' % self.plugin
+		return os.path.join(self.rules_dir, name)
+	
+	@property
+	def profile_xml(self):
+		return os.path.join(self.rules_dir, 'profile-findbugs.xml')
+	
+	@property
+	def properties_file(self):
+		return os.path.join(self.l10n_dir, 'findbugs.properties')
+	
+	@property
+	def data_file(self):
+		return os.path.join(self.root, 'rules.dat')
+	
+	@property
+	def rank_dirs(self):
+		return [os.path.join(self.root, 'ranks', 'rank-%02d' % i) for i in range(self.rankers)]
+	
+	def _word(self):
+		return self.rnd.choice(self.WORDS)
+	
+	def _sentence(self, words):
+		return ' '.join(self._word() for _ in range(words))
+	
+	def _details(self, name):
+		parts = ['', '<p>', '\t%s %s.' % (name, self._sentence(12)), '</p>']
+		for _ in range(self.rnd.randint(0, 2)):
+			parts.extend(['<p>', '\t%s  %s' % (self._sentence(8), self._sentence(10)), '</p>'])
+		if self.rnd.random() < 0.4:
+			parts.extend(['<pre>', 'if (x == null) {', '    return %s;' % self._word(), '}', '</pre>'])
+		if self.rnd.random() < 0.05:
+			parts.append('<p>Data like <code>a[b[0]]]&gt;</code> must survive CDATA quoting.</p>')
+		return '\n\t\t'.join(parts) + '\n\t\t'
+	
+	@staticmethod
+	def _makedirs(path):
+		if not os.path.isdir(path):
+			os.makedirs(path)
+	
+	def write(self):
+		for path in [self.etc_dir, self.rules_dir, self.html_dir] + self.rank_dirs:
+			self._makedirs(path)
+		self.write_findbugs_xml()
+		self.write_messages_xml()
+		self.write_bugrank(self.etc_dir, 0.1)
+		for rank_dir in self.rank_dirs:
+			self.write_bugrank(rank_dir, 0.02)
+		self.write_sonar_pom()
+		self.write_rules_xml()
+		self.write_profile_xml()
+		self.write_properties()
+		self.write_html()
+		self.write_data_file()
+		return self
+	
+	def write_findbugs_xml(self):
+		rnd = self.rnd
+		with open(os.path.join(self.etc_dir, 'findbugs.xml'), 'w') as fh:
+			fh.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+			fh.write('<FindbugsPlugin pluginid="%s" provider="Synthetic" website="http://example.org/">\n' % self.PLUGIN_IDS[self.plugin])
+			for name in self.CATEGORIES:
+				fh.write('  <BugCategory category="%s"/>\n' % name)
+			for i, name in enumerate(self.codes):
+				fh.write('  <BugCode abbrev="%s" cweid="%d"/>\n' % (name, i % 800))
+			for i, name in enumerate(self.names):
+				attrs = ' experimental="true"' if name in self.experimental else ''
+				attrs += ' deprecated="true"' if name in self.deprecated else ''
+				fh.write('  <BugPattern type="%s" abbrev="%s" category="%s"%s cweid="%d"/>\n' % (name, self.codes[i // 5], rnd.choice(self.CATEGORIES), attrs, rnd.randint(0, 800)))
+			fh.write('</FindbugsPlugin>\n')
+	
+	def write_messages_xml(self):
+		with open(os.path.join(self.etc_dir, 'messages.xml'), 'w') as fh:
+			fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<MessageCollection>\n')
+			fh.write('  <Plugin>\n    <ShortDescription>Synthetic %s plugin</ShortDescription>\n    <Details>Generated for benchmarks.</Details>\n  </Plugin>\n' % self.plugin)
+			for name in self.CATEGORIES:
+				fh.write('  <BugCategory category="%s">\n    <Description>%s</Description>\n    <Abbreviation>%s</Abbreviation>\n    <Details>%s</Details>\n  </BugCategory>\n' % (name, name.replace('_', ' ').title(), name[0], self._sentence(6)))
+			for name in self.names:
+				details = self._details(name).replace(']]>', ']]]]><![CDATA[>')
+				fh.write('  <BugPattern type="%s">\n' % name)
+				fh.write('    <ShortDescription>%s  %s</ShortDescription>\n' % (name.split('_')[0].title(), self._sentence(5)))
+				fh.write('    <LongDescription>%s in {1}</LongDescription>\n' % self._sentence(6))
+				fh.write('    <Details>\n<![CDATA[%s]]>\n    </Details>\n  </BugPattern>\n' % details)
+			for name in self.codes:
+				fh.write('  <BugCode abbrev="%s">%s</BugCode>\n' % (name, self._sentence(3)))
+			fh.write('</MessageCollection>\n')
+	
+	def write_bugrank(self, rank_dir, coverage):
+		rnd = self.rnd
+		with open(os.path.join(rank_dir, 'bugrank.txt'), 'w') as fh:
+			fh.write('# synthetic bug ranks\n')
+			for name in self.names:
+				if rnd.random() < coverage:
+					fh.write('%s BugPattern %s\n' % (rnd.choice(['', '+', '-']) + str(rnd.randint(0, 9)), name))
+			for name in self.codes:
+				if rnd.random() < coverage * 2:
+					fh.write('%s BugKind %s\n' % (rnd.choice(['', '+', '-']) + str(rnd.randint(0, 9)), name))
+			for name in self.CATEGORIES:
+				fh.write('%s Category %s\n' % (rnd.choice(['', '+']) + str(rnd.randint(0, 12)), name))
+	
+	def write_sonar_pom(self):
+		with open(os.path.join(self.sonar_dir, 'pom.xml'), 'w') as fh:
+			fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<project>\n  <artifactId>sonar-findbugs-plugin</artifactId>\n</project>\n')
+	
+	def write_rules_xml(self):
+		rnd = self.rnd
+		with open(self.rules_xml, 'w') as fh:
+			fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<rules>\n')
+			for i, name in enumerate(self.names):
+				if rnd.random() < 0.1: continue
+				fh.write('  <rule key="%s" priority="%s">\n' % (name, rnd.choice(self.PRIORITIES)))
+				fh.write('    <name><![CDATA[%s]]></name>\n    <configKey><![CDATA[%s]]></configKey>\n' % (self._sentence(4), name))
+				if name in self.deprecated and rnd.random() < 0.5:
+					fh.write('    <status>DEPRECATED</status>\n')
+					fh.write('    <description>This rule is deprecated, use {rule:squid:S%d} instead.</description>\n' % rnd.randint(100, 3000))
+				elif self.plugin != 'core':
+					fh.write('    <description><![CDATA[<p>%s</p>]]></description>\n' % self._sentence(15))
+				fh.write('    <tag>%s</tag>\n' % self._word())
+				fh.write('  </rule>\n')
+			fh.write('</rules>\n')
+	
+	def write_profile_xml(self):
+		with open(self.profile_xml, 'w') as fh:
+			fh.write('<?xml version="1.0" encoding="UTF-8"?>\n<FindBugsFilter>\n')
+			for name in self.names:
+				if self.rnd.random() < 0.6:
+					fh.write('  <Match>\n    <Bug pattern="%s"/>\n  </Match>\n' % name)
+			fh.write('</FindBugsFilter>\n')
+	
+	def write_properties(self):
+		with open(self.properties_file, 'w') as fh:
+			for name in self.names:
+				fh.write('rule.findbugs.%s.name=%s\n' % (name, self._sentence(4)))
+	
+	def write_html(self):
+		for name in self.names:
+			with open(os.path.join(self.html_dir, '%s.html' % name), 'w') as fh:
+				fh.write('<p>%s</p>\n' % self._sentence(20))
+	
+	def write_data_file(self):
+		rnd = self.rnd
+		with open(self.data_file, 'w') as fh:
+			fh.write('# rule_key:sq_rule_nr:sq_prop_nr:sq_prof_nr:priority:status:reason:tags\n')
+			for i, name in enumerate(sorted(self.names)):
+				status = rnd.choice(['', '', '', '', 'DISABLED', 'DEPRECATED', 'EXPERIMENTAL,DISABLED'])
+				reason = 'S%d' % rnd.randint(100, 3000) if status == 'DEPRECATED' else ''
+				fh.write('%s:%d:%d:%d:%s:%s:%s:%s\n' % (name, i + 1, i + 1, i + 1, rnd.choice(self.PRIORITIES), status, reason, self._word()))
+
+def main():
+	parser = argparse.ArgumentParser(description='Generate synthetic FindBugs and SonarQube plugin inputs.')
+	parser.add_argument('root', metavar='DIR', help='output directory')
+	parser.add_argument('-n', '--patterns', metavar='N', help='number of bug patterns', type=int, default=1000)
+	parser.add_argument('-p', '--plugin', help='plugin flavour', choices=sorted(SyntheticPlugin.PLUGIN_IDS), default='core')
+	parser.add_argument('-r', '--rankers', metavar='N', help='number of additional bugrank files', type=int, default=0)
+	parser.add_argument('-s', '--seed', metavar='N', help='random seed', type=int, default=1)
+	args = parser.parse_args()
+	SyntheticPlugin(args.root, args.patterns, args.plugin, args.rankers, args.seed).write()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+from __future__ import print_function
+import os, sys, json, time, platform, resource, subprocess, argparse, tempfile
+
+from benchmark.generate import SyntheticPlugin
+from benchmark.cases import CASES, SkipCase
+
+class Benchmark():
+	"""Times a callable over several rounds, in the style of pytest-benchmark."""
+	def __init__(self, rounds):
+		self.rounds = rounds
+		self.times = []
+		self.extra_info = {}
+	
+	def __call__(self, func, *args, **kwargs):
+		return self.pedantic(func, args, kwargs)
+	
+	def pedantic(self, func, args = (), kwargs = None, setup = None, rounds = None):
+		result = None
+		for _ in range(rounds or self.rounds):
+			if setup is not None:
+				args, kwargs = setup()
+			started = time.time()
+			result = func(*args, **(kwargs or {}))
+			self.times.append(time.time() - started)
+		return result
+	
+	def stats(self):
+		if not self.times:
+			return None
+		result = dict(self.extra_info)
+		result.update({
+			'rounds': len(self.times),
+			'min': min(self.times),
+			'mean': sum(self.times) / len(self.times),
+			'max': max(self.times)
+		})
+		return result
+
+def get_peak_rss():
+	"""Peak resident set size of this process in kilobytes."""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		peak //= 1024
+	return peak
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Run fbrules-to-sonarqube benchmarks on synthetic plugins.')
+	parser.add_argument('-n', '--patterns', metavar='N', help='number of bug patterns', type=int, default=5000)
+	parser.add_argument('-p', '--plugin', help='plugin flavour', choices=sorted(SyntheticPlugin.PLUGIN_IDS), default='core')
+	parser.add_argument('-r', '--rankers', metavar='N', help='number of additional bugrank files', type=int, default=12)
+	parser.add_argument('-s', '--seed', metavar='N', help='random seed', type=int, default=1)
+	parser.add_argument('--rounds', metavar='N', help='timed rounds per case', type=int, default=3)
+	parser.add_argument('-k', '--case', metavar='NAME', help='run only cases containing NAME', action='append')
+	parser.add_argument('-w', '--work-dir', metavar='DIR', help='directory for generated inputs and outputs', default=os.path.join(tempfile.gettempdir(), 'fbrules-benchmark'))
+	parser.add_argument('--save', metavar='FILE', help='write results as JSON baseline')
+	parser.add_argument('--compare', metavar='FILE', help='compare results against JSON baseline')
+	parser.add_argument('--threshold', metavar='RATIO', help='allowed slowdown or growth before failing', type=float, default=0.2)
+	parser.add_argument('--child', metavar='NAME', help=argparse.SUPPRESS)
+	return parser.parse_args()
+
+def get_plugin(args):
+	root = os.path.join(args.work_dir, '%s-n%d-r%d-s%d' % (args.plugin, args.patterns, args.rankers, args.seed))
+	plugin = SyntheticPlugin(root, args.patterns, args.plugin, args.rankers, args.seed)
+	if not os.path.isfile(plugin.data_file):
+		plugin.write()
+	return plugin
+
+def run_child(args):
+	plugin = get_plugin(args)
+	work_dir = tempfile.mkdtemp(dir=args.work_dir)
+	benchmark = Benchmark(args.rounds)
+	try:
+		CASES[args.child](plugin, benchmark, work_dir)
+		result = benchmark.stats()
+		result['peak_rss_kb'] = get_peak_rss()
+	except SkipCase as e:
+		result = {'skipped': str(e)}
+	finally:
+		import shutil
+		shutil.rmtree(work_dir, True)
+	print(json.dumps(result))
+
+def run_case(args, name):
+	cmd = [sys.executable, '-m', 'benchmark.run', '--child', name, '-n', str(args.patterns), '-p', args.plugin,
+	       '-r', str(args.rankers), '-s', str(args.seed), '--rounds', str(args.rounds), '-w', args.work_dir]
+	root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+	proc = subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE)
+	output = proc.communicate()[0]
+	if proc.returncode != 0:
+		return {'error': 'exit code %d' % proc.returncode}
+	return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+def compare(results, baseline, threshold):
+	regressions = []
+	for name, result in results.items():
+		base = baseline.get('cases', {}).get(name)
+		if base is None or 'min' not in base or 'min' not in result:
+			continue
+		for key in ('min', 'peak_rss_kb'):
+			if base[key] > 0 and result[key] > base[key] * (1 + threshold):
+				regressions.append('%s: %s %.3f -> %.3f' % (name, key, base[key], result[key]))
+	return regressions
+
+def main():
+	args = parse_args()
+	if not os.path.isdir(args.work_dir):
+		os.makedirs(args.work_dir)
+	if args.child:
+		return run_child(args)
+	names = [n for n in CASES if not args.case or any(k in n for k in args.case)]
+	get_plugin(args)
+	results = {}
+	print('%-30s %8s %8s %8s %10s' % ('case', 'min', 'mean', 'max', 'peak_kb'))
+	for name in names:
+		result = run_case(args, name)
+		results[name] = result
+		if 'min' in result:
+			print('%-30s %8.3f %8.3f %8.3f %10d' % (name, result['min'], result['mean'], result['max'], result['peak_rss_kb']))
+		else:
+			print('%-30s %s' % (name, result.get('skipped') or result.get('error')))
+	report = {
+		'python': platform.python_version(),
+		'patterns': args.patterns,
+		'plugin': args.plugin,
+		'rankers': args.rankers,
+		'seed': args.seed,
+		'rounds': args.rounds,
+		'cases': results
+	}
+	if args.save:
+		with open(args.save, 'w') as fh:
+			json.dump(report, fh, indent=1, sort_keys=True, separators=(',', ': '))
+	if args.compare:
+		with open(args.compare, 'r') as fh:
+			baseline = json.load(fh)
+		for key in ('python', 'patterns', 'plugin', 'rankers', 'seed'):
+			if baseline.get(key) != report[key]:
+				print('warning: baseline %s is %s, current is %s' % (key, baseline.get(key), report[key]), file=sys.stderr)
+		regressions = compare(results, baseline, args.threshold)
+		for regression in regressions:
+			print('regression: %s' % regression, file=sys.stderr)
+		if regressions:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+   
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+   
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+   
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+   
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+from __future__ import print_function
+import sys, os, argparse, py_compile, shutil, stat, tempfile, zipfile
+
+MODULES = [('fb.py', 'fb'), ('sq.py', 'sq'), ('cache.py', 'cache'), ('textutils.py', 'textutils'), ('stats.py', 'stats'), ('catalog.py', 'catalog'), ('archive.py', 'archive'),
+           ('fb2sq.py', 'fb2sq'), ('fb.rules.py', 'fb_rules')]
+
+MAIN = '''# -*- coding: utf-8 -*-
+import sys, runpy
+TOOLS = {'fb2sq': 'fb2sq', 'rules': 'fb_rules'}
+if len(sys.argv) < 2 or sys.argv[1] not in TOOLS:
+	sys.exit('usage: %s fb2sq|rules [args]' % sys.argv[0])
+tool = sys.argv.pop(1)
+sys.argv[0] = '%s %s' % (sys.argv[0], tool)
+runpy.run_module(TOOLS[tool], run_name='__main__', alter_sys=True)
+'''
+
+def parse_args():
+	parser = argparse.ArgumentParser(description='Bundle fb2sq and fb.rules into a single executable archive with precompiled bytecode.')
+	parser.add_argument('-o', '--output', metavar='FILE', help='bundle file', default=os.path.join('build', 'fbrules.pyz'))
+	return parser.parse_args()
+
+def add_entry(zf, name, data):
+	zi = zipfile.ZipInfo(name, (1980, 1, 1, 0, 0, 0))
+	zi.compress_type = zipfile.ZIP_DEFLATED
+	zi.external_attr = (stat.S_IFREG | 0o644) << 16
+	zf.writestr(zi, data)
+
+def compile_module(src_file, pyc_file, dfile):
+	"""Bytecode for src_file which does not depend on the source mtime."""
+	kwargs = {}
+	if hasattr(py_compile, 'PycInvalidationMode'):
+		kwargs['invalidation_mode'] = py_compile.PycInvalidationMode.UNCHECKED_HASH
+	py_compile.compile(src_file, cfile=pyc_file, dfile=dfile, doraise=True, **kwargs)
+	with open(pyc_file, 'rb') as f:
+		data = f.read()
+	if not kwargs:
+		# magic, then the source mtime; zipimport only checks it against a .py in the archive
+		data = data[:4] + b'\0\0\0\0' + data[8:]
+	return data
+
+def bundle(output):
+	cdir = os.path.dirname(os.path.realpath(__file__))
+	output_dir = os.path.dirname(os.path.abspath(output))
+	if not os.path.isdir(output_dir):
+		os.makedirs(output_dir)
+	tmp_dir = tempfile.mkdtemp()
+	try:
+		tmp_file = os.path.join(tmp_dir, 'bundle.zip')
+		zf = zipfile.ZipFile(tmp_file, 'w')
+		for src_name, module_name in MODULES:
+			pyc_file = os.path.join(tmp_dir, module_name + '.pyc')
+			add_entry(zf, module_name + '.pyc', compile_module(os.path.join(cdir, src_name), pyc_file, src_name))
+		add_entry(zf, '__main__.py', MAIN)
+		zf.close()
+		with open(output, 'wb') as out:
+			out.write(b'#!/usr/bin/env python\n')
+			with open(tmp_file, 'rb') as f:
+				shutil.copyfileobj(f, out)
+	finally:
+		shutil.rmtree(tmp_dir)
+	os.chmod(output, 0o755)
+
+def main():
+	args = parse_args()
+	bundle(args.output)
+	print(args.output)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+   
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+   
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+   
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+   
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, stat, errno, hashlib, marshal, tempfile, zlib
+from archive import Archive
+
+class ParseCache():
+	"""On-disk cache of parsed models, keyed by input file fingerprints.
+	
+	Entries are marshalled and compressed, written through a temporary file
+	and renamed into place, so concurrent readers never see partial data.
+	Each hit touches the entry; once the cache grows beyond max_size bytes
+	the least recently used entries are removed until it is back under
+	LOW_WATER of max_size, so a full cache is not rescanned on every store.
+	The cache directory is only rescanned when the size stored since the
+	last scan could exceed max_size.
+	"""
+	FORMAT = 1
+	SUFFIX = '.cache'
+	DEFAULT_SIZE = 64 * 1024 * 1024
+	LOW_WATER = 0.9
+	
+	def __init__(self, cache_dir, max_size = None):
+		self.cache_dir = os.path.realpath(os.path.expanduser(cache_dir))
+		self.max_size = max_size if max_size is not None else ParseCache.DEFAULT_SIZE
+		self.hits = 0
+		self.misses = 0
+		self._size = None
+	
+	@staticmethod
+	def _get_file_hash(file_path):
+		h = hashlib.sha1()
+		with open(file_path, 'rb') as f:
+			while True:
+				chunk = f.read(65536)
+				if not chunk: break
+				h.update(chunk)
+		return h.hexdigest()
+	
+	@staticmethod
+	def _get_fingerprints(path, content = True):
+		if path is None:
+			return [(None, )]
+		return ParseCache._walk_fingerprints(os.path.realpath(os.path.expanduser(path)), content)
+	
+	@staticmethod
+	def _walk_fingerprints(path, content):
+		# path is resolved already, entries below it need no realpath of their own
+		try:
+			st = os.stat(path)
+		except OSError:
+			st = None
+		if st is not None and stat.S_ISDIR(st.st_mode):
+			fingerprints = [(path, 'dir')]
+			for fn in sorted(os.listdir(path)):
+				fingerprints.extend(ParseCache._walk_fingerprints(os.path.join(path, fn), content))
+			return fingerprints
+		if st is None or not stat.S_ISREG(st.st_mode):
+			archive_file, member = Archive.split(path)
+			if archive_file is not None:
+				return [(path, 'member')] + ParseCache._get_fingerprints(archive_file, content)
+			return [(path, None)]
+		if not content:
+			return [(path, st.st_size, repr(st.st_mtime))]
+		return [(path, st.st_size, repr(st.st_mtime), ParseCache._get_file_hash(path))]
+	
+	def get_key(self, kind, paths):
+		h = hashlib.sha1()
+		h.update(repr((ParseCache.FORMAT, sys.version_info[:2], kind)).encode('utf-8'))
+		for path in paths:
+			for fingerprint in ParseCache._get_fingerprints(path):
+				h.update(repr(fingerprint).encode('utf-8'))
+		return h.hexdigest()
+	
+	def get_data_key(self, kind, values):
+		h = hashlib.sha1()
+		h.update(repr((ParseCache.FORMAT, sys.version_info[:2], kind)).encode('utf-8'))
+		for value in values:
+			if not isinstance(value, bytes):
+				value = value.encode('utf-8')
+			h.update(hashlib.sha1(value).digest())
+		return h.hexdigest()
+	
+	def _get_entry(self, key):
+		return os.path.join(self.cache_dir, key + ParseCache.SUFFIX)
+	
+	def load(self, key):
+		entry = self._get_entry(key)
+		try:
+			with open(entry, 'rb') as f:
+				data = marshal.loads(zlib.decompress(f.read()))
+		except (IOError, OSError, EOFError, ValueError, TypeError, zlib.error):
+			self.misses += 1
+			return None
+		try:
+			os.utime(entry, None)
+		except OSError:
+			pass
+		self.hits += 1
+		return data
+	
+	def store(self, key, data):
+		try:
+			os.makedirs(self.cache_dir)
+		except OSError as exception:
+			if exception.errno != errno.EEXIST:
+				return False
+		content = zlib.compress(marshal.dumps(data, 2))
+		if len(content) > self.max_size:
+			return False
+		fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+		try:
+			with os.fdopen(fd, 'wb') as f:
+				f.write(content)
+			os.rename(tmp_path, self._get_entry(key))
+		except (IOError, OSError):
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			return False
+		if self._size is not None:
+			self._size += len(content)
+		if self._size is None or self._size > self.max_size:
+			self._evict()
+		return True
+	
+	def _evict(self):
+		entries = []
+		total_size = 0
+		for fn in os.listdir(self.cache_dir):
+			if not fn.endswith(ParseCache.SUFFIX):
+				continue
+			fp = os.path.join(self.cache_dir, fn)
+			try:
+				st = os.stat(fp)
+			except OSError:
+				continue
+			entries.append((st.st_mtime, st.st_size, fp))
+			total_size += st.st_size
+		if total_size <= self.max_size:
+			self._size = total_size
+			return
+		low_water = self.max_size * ParseCache.LOW_WATER
+		for mtime, size, fp in sorted(entries):
+			if total_size <= low_water:
+				break
+			try:
+				os.remove(fp)
+			except OSError:
+				pass
+			total_size -= size
+		self._size = total_size
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, time, json, hashlib, sqlite3
+from cache import ParseCache
+from fb import FindBugsPlugin
+from sq import SonarQube
+
+class RuleCatalog():
+	"""SQLite catalog of FindBugs plugins, SonarQube rule sets and fb2sq data files.
+	
+	Sources are keyed by their resolved path, so a catalog can hold any
+	number of plugin versions side by side. Importing a source again
+	replaces its previous rows. Loaded models are rebuilt through the same
+	_from_data constructors the parse cache uses.
+	
+	Every source keeps the input paths it was read from, a stamp of their
+	sizes and mtimes and a fingerprint of their sizes and content hashes,
+	taken from the same material as the parse cache keys. Loads compare the
+	stamp and only hash the inputs when it differs. A source whose inputs
+	changed since the import is not served: load_* warns and returns None,
+	so callers parse it instead.
+	"""
+	FORMAT = 2
+	SCHEMA = [
+		'CREATE TABLE IF NOT EXISTS catalog (format INTEGER NOT NULL)',
+		'CREATE TABLE IF NOT EXISTS plugins (id INTEGER PRIMARY KEY, source TEXT UNIQUE NOT NULL, plugin_id TEXT, short_id TEXT, provider TEXT, website TEXT, description TEXT, details TEXT, imported REAL, inputs TEXT, stamp TEXT, fingerprint TEXT)',
+		'CREATE TABLE IF NOT EXISTS categories (plugin INTEGER NOT NULL, name TEXT NOT NULL, is_hidden INTEGER, abbr TEXT, description TEXT, details TEXT)',
+		'CREATE TABLE IF NOT EXISTS patterns (plugin INTEGER NOT NULL, name TEXT NOT NULL, abbr TEXT, category TEXT, is_experimental INTEGER, is_deprecated INTEGER, short_desc TEXT, long_desc TEXT, details TEXT, cweid INTEGER, pattern_index INTEGER, message_index INTEGER, rank INTEGER)',
+		'CREATE TABLE IF NOT EXISTS codes (plugin INTEGER NOT NULL, name TEXT NOT NULL, description TEXT, cweid INTEGER)',
+		'CREATE TABLE IF NOT EXISTS ranks (plugin INTEGER NOT NULL, level INTEGER NOT NULL, key TEXT NOT NULL, adjustment INTEGER, relative INTEGER)',
+		'CREATE TABLE IF NOT EXISTS rulesets (id INTEGER PRIMARY KEY, source TEXT UNIQUE NOT NULL, kind TEXT NOT NULL, imported REAL, inputs TEXT, stamp TEXT, fingerprint TEXT)',
+		'CREATE TABLE IF NOT EXISTS rules (ruleset INTEGER NOT NULL, key TEXT NOT NULL, config_key TEXT, priority TEXT, status TEXT, cardinality TEXT, name TEXT, description TEXT, deprecated_by TEXT, tags TEXT, pattern_index INTEGER, properties_index INTEGER)',
+		'CREATE TABLE IF NOT EXISTS rule_params (ruleset INTEGER NOT NULL, rule_key TEXT NOT NULL, key TEXT, ptype TEXT, description TEXT, default_value TEXT)',
+		'CREATE TABLE IF NOT EXISTS profile_rules (ruleset INTEGER NOT NULL, key TEXT NOT NULL, idx INTEGER)',
+		'CREATE TABLE IF NOT EXISTS data_rows (ruleset INTEGER NOT NULL, line_nr INTEGER NOT NULL, key TEXT, sq_rule_nr INTEGER, sq_prop_nr INTEGER, sq_prof_nr INTEGER, priority TEXT, status TEXT, reason TEXT, tags TEXT, row TEXT)',
+		'CREATE INDEX IF NOT EXISTS categories_plugin ON categories (plugin)',
+		'CREATE INDEX IF NOT EXISTS patterns_plugin ON patterns (plugin)',
+		'CREATE INDEX IF NOT EXISTS patterns_name ON patterns (name)',
+		'CREATE INDEX IF NOT EXISTS patterns_category ON patterns (category)',
+		'CREATE INDEX IF NOT EXISTS patterns_cweid ON patterns (cweid)',
+		'CREATE INDEX IF NOT EXISTS patterns_rank ON patterns (rank)',
+		'CREATE INDEX IF NOT EXISTS codes_plugin ON codes (plugin)',
+		'CREATE INDEX IF NOT EXISTS ranks_plugin ON ranks (plugin)',
+		'CREATE INDEX IF NOT EXISTS rules_ruleset ON rules (ruleset)',
+		'CREATE INDEX IF NOT EXISTS rules_key ON rules (key)',
+		'CREATE INDEX IF NOT EXISTS rules_priority ON rules (priority)',
+		'CREATE INDEX IF NOT EXISTS rules_status ON rules (status)',
+		'CREATE INDEX IF NOT EXISTS rule_params_ruleset ON rule_params (ruleset)',
+		'CREATE INDEX IF NOT EXISTS profile_rules_ruleset ON profile_rules (ruleset)',
+		'CREATE INDEX IF NOT EXISTS data_rows_ruleset ON data_rows (ruleset)',
+		'CREATE INDEX IF NOT EXISTS data_rows_key ON data_rows (key)',
+		'CREATE INDEX IF NOT EXISTS data_rows_priority ON data_rows (priority)',
+		'CREATE INDEX IF NOT EXISTS data_rows_status ON data_rows (status)'
+	]
+	
+	def __init__(self, db_file):
+		self.db_file = RuleCatalog.get_source(db_file)
+		self.db = sqlite3.connect(self.db_file)
+		if sys.version_info[0] < 3:
+			self.db.text_factory = str
+		with self.db:
+			for statement in RuleCatalog.SCHEMA:
+				self.db.execute(statement)
+			row = self.db.execute('SELECT format FROM catalog').fetchone()
+			if row is None:
+				self.db.execute('INSERT INTO catalog (format) VALUES (?)', (RuleCatalog.FORMAT, ))
+			elif row[0] != RuleCatalog.FORMAT:
+				raise Exception('"%s" has unsupported catalog format %d' % (self.db_file, row[0]))
+	
+	def close(self):
+		self.db.close()
+	
+	@staticmethod
+	def get_source(path):
+		return os.path.realpath(os.path.expanduser(path))
+	
+	@staticmethod
+	def _split(value):
+		return value.split(',') if value else []
+	
+	@staticmethod
+	def get_fingerprint(inputs, content = False):
+		"""Digest of the sizes and mtimes of inputs, or of their sizes and contents."""
+		h = hashlib.sha1()
+		for path in inputs:
+			for fingerprint in ParseCache._get_fingerprints(path, content):
+				if content and len(fingerprint) == 4:
+					# a touched but unchanged file keeps its fingerprint
+					fingerprint = fingerprint[:2] + fingerprint[3:]
+				h.update(repr(fingerprint).encode('utf-8'))
+		return h.hexdigest()
+	
+	@staticmethod
+	def _get_inputs(*paths):
+		inputs = json.dumps([RuleCatalog.get_source(p) if p is not None else None for p in paths])
+		# fingerprinted as loaded back, json gives unicode paths on Python 2
+		paths = json.loads(inputs)
+		return inputs, RuleCatalog.get_fingerprint(paths), RuleCatalog.get_fingerprint(paths, True)
+	
+	def _get_id(self, table, source):
+		row = self.db.execute('SELECT id, inputs, stamp, fingerprint FROM %s WHERE source = ?' % table, (RuleCatalog.get_source(source), )).fetchone()
+		if row is None:
+			return None
+		row_id, inputs, stamp, fingerprint = row
+		inputs = json.loads(inputs)
+		new_stamp = RuleCatalog.get_fingerprint(inputs)
+		if new_stamp == stamp:
+			return row_id
+		if RuleCatalog.get_fingerprint(inputs, True) != fingerprint:
+			sys.stderr.write('warning: "%s" changed since it was imported into "%s", not using the catalog for it\n' % (RuleCatalog.get_source(source), self.db_file))
+			return None
+		# only touched, the next load can take the stamp again
+		try:
+			with self.db:
+				self.db.execute('UPDATE %s SET stamp = ? WHERE id = ?' % table, (new_stamp, row_id))
+		except sqlite3.Error:
+			pass
+		return row_id
+	
+	def _get_old_id(self, table, source):
+		row = self.db.execute('SELECT id FROM %s WHERE source = ?' % table, (source, )).fetchone()
+		return row[0] if row is not None else None
+	
+	def _replace(self, table, children, columns, values):
+		source = values[0]
+		old_id = self._get_old_id(table, source)
+		if old_id is not None:
+			for child in children:
+				self.db.execute('DELETE FROM %s WHERE %s = ?' % child, (old_id, ))
+			self.db.execute('DELETE FROM %s WHERE id = ?' % table, (old_id, ))
+		marks = ', '.join('?' * len(columns))
+		return self.db.execute('INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), marks), values).lastrowid
+	
+	def import_plugin(self, etc_dir, stream = False):
+		source = RuleCatalog.get_source(etc_dir)
+		inputs, stamp, fingerprint = RuleCatalog._get_inputs(source)
+		plugin = FindBugsPlugin.parse(source, stream)
+		head_data, categories, patterns, codes, ranker = plugin._to_data()
+		ranks = FindBugsPlugin.BugRanker.merge([plugin.ranker])
+		children = [('categories', 'plugin'), ('patterns', 'plugin'), ('codes', 'plugin'), ('ranks', 'plugin')]
+		with self.db:
+			plugin_id, provider, website, description, details = head_data
+			pid = self._replace('plugins', children, ('source', 'plugin_id', 'short_id', 'provider', 'website', 'description', 'details', 'imported', 'inputs', 'stamp', 'fingerprint'),
+				(source, plugin_id, plugin.head.short_id, provider, website, description, details, time.time(), inputs, stamp, fingerprint))
+			self.db.executemany('INSERT INTO categories VALUES (?, ?, ?, ?, ?, ?)', [(pid, ) + c for c in categories])
+			self.db.executemany('INSERT INTO patterns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [(pid, ) + p + (ranks.rank(plugin.patterns[p[0]]), ) for p in patterns])
+			self.db.executemany('INSERT INTO codes VALUES (?, ?, ?, ?)', [(pid, ) + c for c in codes])
+			for level, (adjustment, relative) in enumerate(ranker):
+				self.db.executemany('INSERT INTO ranks VALUES (?, ?, ?, ?, ?)', [(pid, level, k, v, k in relative) for k, v in adjustment.items()])
+		return plugin
+	
+	def load_plugin(self, etc_dir):
+		pid = self._get_id('plugins', etc_dir)
+		if pid is None:
+			return None
+		db = self.db
+		head_data = db.execute('SELECT plugin_id, provider, website, description, details FROM plugins WHERE id = ?', (pid, )).fetchone()
+		categories = [(name, bool(is_hidden), abbr, description, details) for name, is_hidden, abbr, description, details in
+			db.execute('SELECT name, is_hidden, abbr, description, details FROM categories WHERE plugin = ? ORDER BY rowid', (pid, ))]
+		patterns = [(name, abbr, category, bool(is_exp), bool(is_old), short_desc, long_desc, details, cweid, pattern_index, message_index)
+			for name, abbr, category, is_exp, is_old, short_desc, long_desc, details, cweid, pattern_index, message_index in
+			db.execute('SELECT name, abbr, category, is_experimental, is_deprecated, short_desc, long_desc, details, cweid, pattern_index, message_index FROM patterns WHERE plugin = ? ORDER BY rowid', (pid, ))]
+		codes = db.execute('SELECT name, description, cweid FROM codes WHERE plugin = ? ORDER BY rowid', (pid, )).fetchall()
+		ranker = [({}, {}), ({}, {}), ({}, {})]
+		for level, key, adjustment, relative in db.execute('SELECT level, key, adjustment, relative FROM ranks WHERE plugin = ?', (pid, )):
+			ranker[level][0][key] = adjustment
+			if relative:
+				ranker[level][1][key] = True
+		return FindBugsPlugin._from_data((tuple(head_data), categories, patterns, codes, ranker))
+	
+	def import_rules(self, rules_xml, prop_file = None, html_dir = None, stream = False):
+		source = RuleCatalog.get_source(rules_xml)
+		inputs, stamp, fingerprint = RuleCatalog._get_inputs(source, prop_file, html_dir)
+		rules = SonarQube.Rules.parse(source, prop_file, html_dir, stream)
+		children = [('rules', 'ruleset'), ('rule_params', 'ruleset')]
+		with self.db:
+			rid = self._replace('rulesets', children, ('source', 'kind', 'imported', 'inputs', 'stamp', 'fingerprint'), (source, 'rules', time.time(), inputs, stamp, fingerprint))
+			for key, config_key, priority, status, cardinality, name, description, deprecated_by, tags, params, pattern_index, properties_index in rules._to_data():
+				self.db.execute('INSERT INTO rules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+					(rid, key, config_key, priority, status, cardinality, name, description, ','.join(deprecated_by), ','.join(tags), pattern_index, properties_index))
+				self.db.executemany('INSERT INTO rule_params VALUES (?, ?, ?, ?, ?, ?)', [(rid, key) + tuple(p) for p in params])
+		return rules
+	
+	def load_rules(self, rules_xml):
+		rid = self._get_id('rulesets', rules_xml)
+		if rid is None:
+			return None
+		params = {}
+		for rule_key, key, ptype, description, default_value in self.db.execute('SELECT rule_key, key, ptype, description, default_value FROM rule_params WHERE ruleset = ? ORDER BY rowid', (rid, )):
+			params.setdefault(rule_key, []).append((key, ptype, description, default_value))
+		data = []
+		for row in self.db.execute('SELECT key, config_key, priority, status, cardinality, name, description, deprecated_by, tags, pattern_index, properties_index FROM rules WHERE ruleset = ? ORDER BY rowid', (rid, )):
+			key, config_key, priority, status, cardinality, name, description, deprecated_by, tags, pattern_index, properties_index = row
+			data.append((key, config_key, priority, status, cardinality, name, description, RuleCatalog._split(deprecated_by), RuleCatalog._split(tags), params.get(key, []), pattern_index, properties_index))
+		return SonarQube.Rules._from_data(data)
+	
+	def import_profile(self, profile_xml):
+		source = RuleCatalog.get_source(profile_xml)
+		inputs, stamp, fingerprint = RuleCatalog._get_inputs(source)
+		profile = SonarQube.RulesProfile.parse(source)
+		with self.db:
+			rid = self._replace('rulesets', [('profile_rules', 'ruleset')], ('source', 'kind', 'imported', 'inputs', 'stamp', 'fingerprint'), (source, 'profile', time.time(), inputs, stamp, fingerprint))
+			self.db.executemany('INSERT INTO profile_rules VALUES (?, ?, ?)', [(rid, item.key, item.index) for item in profile.values()])
+		return profile
+	
+	def load_profile(self, profile_xml):
+		rid = self._get_id('rulesets', profile_xml)
+		if rid is None:
+			return None
+		profile = SonarQube.RulesProfile()
+		for key, idx in self.db.execute('SELECT key, idx FROM profile_rules WHERE ruleset = ? ORDER BY idx', (rid, )):
+			profile[key] = SonarQube.RuleProfileItem(key, idx)
+		return profile
+	
+	@staticmethod
+	def _get_data_row(line_nr, line):
+		row = line.rstrip('\r\n')
+		props = row.split(':')
+		if row.startswith('#') or len(props) < 5:
+			return (line_nr, None, None, None, None, None, None, None, None, row)
+		nrs = []
+		for v in props[1:4]:
+			try:
+				nrs.append(int(v))
+			except ValueError:
+				nrs.append(0)
+		extra = [props[i].strip() if len(props) > i else None for i in (5, 6, 7)]
+		return (line_nr, props[0].strip()) + tuple(nrs) + (props[4].strip(), ) + tuple(extra) + (row, )
+	
+	def import_data_file(self, data_file):
+		source = RuleCatalog.get_source(data_file)
+		inputs, stamp, fingerprint = RuleCatalog._get_inputs(source)
+		with open(source, 'r') as f:
+			rows = [RuleCatalog._get_data_row(line_nr, line) for line_nr, line in enumerate(f)]
+		with self.db:
+			rid = self._replace('rulesets', [('data_rows', 'ruleset')], ('source', 'kind', 'imported', 'inputs', 'stamp', 'fingerprint'), (source, 'data', time.time(), inputs, stamp, fingerprint))
+			self.db.executemany('INSERT INTO data_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [(rid, ) + row for row in rows])
+		return len(rows)
+	
+	def load_data_file(self, data_file):
+		rid = self._get_id('rulesets', data_file)
+		if rid is None:
+			return None
+		return [row + '\n' for row, in self.db.execute('SELECT row FROM data_rows WHERE ruleset = ? ORDER BY line_nr', (rid, ))]
+	
+	def __repr__(self):
+		counts = []
+		for table in ('plugins', 'patterns', 'rulesets', 'rules', 'data_rows'):
+			counts.append('%s=%d' % (table, self.db.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]))
+		return 'RuleCatalog(%s)' % ', '.join(counts)
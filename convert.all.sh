@@ -0,0 +1,12 @@
+#!/bin/sh
+if [ X"$1" = X"" -o X"$2" = X"" -o X"$3" = X"" ]; then
+	echo "usage: $0 <findbugs-dir> <fb-contrib-dir> <findsecbugs-dir>"
+	exit 1
+fi
+
+_cdir=$(cd -- "$(dirname "$0")" && pwd)
+"${_cdir}/fb2sq.py" -e findbugs:TESTING -e findbugs:TESTING1 -e findbugs:TESTING2 -e findbugs:TESTING3 -e findbugs:UNKNOWN \
+	-e fbcontrib:CD_CIRCULAR_DEPENDENCY --html --tidy \
+	"${_cdir}/sq_rules.findbugs.dat" "$1/findbugs/etc" \
+	-p "${_cdir}/sq_rules.fbcontrib.dat" "$2/etc" \
+	-p "${_cdir}/sq_rules.findsecbugs.dat" "$3/plugin/src/main/resources/metadata"
@@ -23,8 +23,16 @@
    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
    THE SOFTWARE.
 """
-import os, re
+import os, hashlib
 from lxml import etree
+from textutils import TextUtils
+from stats import Stats
+from archive import Archive
+
+try:
+	_intern = intern
+except NameError:
+	from sys import intern as _intern
 
 class FbXml():
 	@staticmethod
@@ -49,6 +57,32 @@ class FbXml():
 	def get_cnode_text(xnode, child_name, default_value=None, clean=False):
 		xnode = FbXml.get_node(xnode, child_name)
 		return FbXml.get_node_text(xnode, default_value, clean)
+	
+	@staticmethod
+	def iter_children(xml_file):
+		"""Stream (position, node) for each direct child of the root element.
+		
+		Position 0 is the root itself, reported as soon as it is opened.
+		Children are reported once complete, with 1-based positions matching
+		getparent().index() + 1, and are cleared after being consumed.
+		"""
+		depth = 0
+		position = 0
+		for event, xnode in etree.iterparse(xml_file, events=('start', 'end', 'comment', 'pi')):
+			if event == 'start':
+				depth += 1
+				if depth == 1:
+					yield 0, xnode
+			elif event == 'end':
+				depth -= 1
+				if depth == 1:
+					position += 1
+					yield position, xnode
+					xnode.clear()
+					while xnode.getprevious() is not None:
+						del xnode.getparent()[0]
+			elif depth == 1:
+				position += 1
 
 
 class FbUtils():
@@ -72,7 +106,24 @@ class FbUtils():
 	
 	@staticmethod
 	def get_clean(text):
-		return re.sub(r'[\n\t\s]+', ' ', text).strip()
+		return TextUtils.get_clean(text)
+	
+	@staticmethod
+	def get_interned(s):
+		try:
+			return _intern(s)
+		except TypeError:
+			return s
+	
+	@staticmethod
+	def get_hash(value):
+		if value is None:
+			value = ''
+		if not isinstance(value, (bytes, type(u''))):
+			value = str(value)
+		if not isinstance(value, bytes):
+			value = value.encode('utf-8')
+		return hashlib.sha1(value).hexdigest()
 	
 	@staticmethod
 	def get_dir(p):
@@ -89,6 +140,14 @@ class FbUtils():
 		return os.path.realpath(p)
 
 class FindBugsPlugin():
+	_XP_PLG_CATEGORIES = etree.XPath('/FindbugsPlugin/BugCategory')
+	_XP_PLG_PATTERNS = etree.XPath('/FindbugsPlugin/BugPattern')
+	_XP_PLG_CODES = etree.XPath('/FindbugsPlugin/BugCode')
+	_XP_MSG_PLUGIN = etree.XPath('/MessageCollection/Plugin')
+	_XP_MSG_CATEGORIES = etree.XPath('/MessageCollection/BugCategory')
+	_XP_MSG_PATTERNS = etree.XPath('/MessageCollection/BugPattern')
+	_XP_MSG_CODES = etree.XPath('/MessageCollection/BugCode')
+	
 	def __init__(self, head, categories, patterns, codes):
 		self.head = head
 		self.categories = categories
@@ -99,17 +158,19 @@ class FindBugsPlugin():
 	@staticmethod
 	def find_conf_dir(plugin_dir):
 		plugin_dir = FbUtils.get_dir(plugin_dir)
-		if not os.path.isdir(plugin_dir):
+		if Archive.is_archive(plugin_dir):
+			return Archive.find_dir(plugin_dir, ['findbugs.xml', 'messages.xml'])
+		if not Archive.isdir(plugin_dir):
 			return None
 		findbugs_xml = FbUtils.get_file('findbugs.xml', plugin_dir)
 		messages_xml = FbUtils.get_file('messages.xml', plugin_dir)
-		if os.path.isfile(findbugs_xml) and os.path.isfile(messages_xml):
+		if Archive.isfile(findbugs_xml) and Archive.isfile(messages_xml):
 			return plugin_dir
 		pom_xml = FbUtils.get_file('pom.xml', plugin_dir)
-		if not os.path.isfile(pom_xml):
+		if not Archive.isfile(pom_xml):
 			return None
 		parser = etree.XMLParser(recover=True)
-		xtree = etree.parse(pom_xml, parser)
+		xtree = etree.parse(Archive.get_source(pom_xml), parser)
 		xroot = xtree.getroot()
 		if xroot is None:
 			return None
@@ -133,17 +194,44 @@ class FindBugsPlugin():
 			return None
 	
 	@staticmethod
-	def parse(etc_dir):
-		etc_dir = FbUtils.get_dir(etc_dir)
-		if not os.path.isdir(etc_dir):
-			raise Exception('"%s" does not exist' % etc_dir)
-		findbugs_xml = FbUtils.get_file('findbugs.xml', etc_dir)
-		messages_xml = FbUtils.get_file('messages.xml', etc_dir)
-		if not os.path.isfile(findbugs_xml):
-			raise Exception('"%s" does not exist' % findbugs_xml)
-		if not os.path.isfile(messages_xml):
-			raise Exception('"%s" does not exist' % messages_xml)
+	def iter_pattern_names(etc_dir):
+		"""Stream (short_id, position, name) for each BugPattern in findbugs.xml.
 		
+		Unlike parse(), repeated pattern names are all reported.
+		"""
+		findbugs_xml = FbUtils.get_file('findbugs.xml', etc_dir)
+		short_id = None
+		for position, xnode in FbXml.iter_children(Archive.get_source(findbugs_xml)):
+			if position == 0:
+				plugin_id = FbXml.get_attr_value(xnode, 'pluginid')
+				if not plugin_id:
+					raise Exception('pluginid attribute not found in root node')
+				short_id = FindBugsPlugin.Head._get_short_id(plugin_id)
+				continue
+			if xnode.tag != 'BugPattern':
+				continue
+			bp_name = FbXml.get_attr_value(xnode, 'type')
+			if bp_name:
+				yield short_id, position, bp_name
+	
+	@staticmethod
+	def _index_nodes(xnodes, attr_name):
+		index = {}
+		for xnode in xnodes:
+			key = xnode.get(attr_name)
+			if key is None: continue
+			if key in index:
+				index[key].append(xnode)
+			else:
+				index[key] = [xnode]
+		return index
+	
+	@staticmethod
+	def _index_positions(xparent):
+		return dict((xchild, i + 1) for i, xchild in enumerate(xparent))
+	
+	@staticmethod
+	def _parse_tree(findbugs_xml, messages_xml):
 		plg_xtree = etree.parse(findbugs_xml)
 		plg_xroot = plg_xtree.getroot()
 		
@@ -153,7 +241,7 @@ class FindBugsPlugin():
 		head = FindBugsPlugin.Head.parse(plg_xtree, msg_xtree)
 		
 		categories = {}
-		for xcat in plg_xtree.xpath('/FindbugsPlugin/BugCategory'):
+		for xcat in FindBugsPlugin._XP_PLG_CATEGORIES(plg_xtree):
 			cat_name = FbXml.get_attr_value(xcat, 'category')
 			if not cat_name: continue
 			if cat_name in categories: continue
@@ -162,7 +250,7 @@ class FindBugsPlugin():
 			category.is_hidden = is_hidden
 			categories[cat_name] = category
 			
-		for xcat in msg_xtree.xpath('/MessageCollection/BugCategory'):
+		for xcat in FindBugsPlugin._XP_MSG_CATEGORIES(msg_xtree):
 			cat_name = FbXml.get_attr_value(xcat, 'category')
 			if not cat_name: continue
 			if cat_name in categories:
@@ -177,8 +265,11 @@ class FindBugsPlugin():
 			if details: category.details = details
 			categories[cat_name] = category
 		
+		msg_xbps = FindBugsPlugin._index_nodes(FindBugsPlugin._XP_MSG_PATTERNS(msg_xtree), 'type')
+		plg_positions = FindBugsPlugin._index_positions(plg_xroot)
+		msg_positions = FindBugsPlugin._index_positions(msg_xroot)
 		patterns = {}
-		for plg_xbp in plg_xtree.xpath('/FindbugsPlugin/BugPattern'):
+		for plg_xbp in FindBugsPlugin._XP_PLG_PATTERNS(plg_xtree):
 			bp_name = FbXml.get_attr_value(plg_xbp, 'type')
 			if not bp_name: continue
 			bp_abbr = FbXml.get_attr_value(plg_xbp, 'abbrev')
@@ -187,29 +278,29 @@ class FindBugsPlugin():
 			bp_is_exp = (FbXml.get_attr_value(plg_xbp, 'experimental').lower() == 'true')
 			bp_is_old = (FbXml.get_attr_value(plg_xbp, 'deprecated').lower() == 'true')
 			
-			msg_xbp = msg_xtree.xpath('/MessageCollection/BugPattern[@type="%s"]' % bp_name)
+			msg_xbp = msg_xbps.get(bp_name, [])
 			if len(msg_xbp) != 1:
 				raise Exception('could not find message for bug pattern "%s"' % bp_name)
 			xmsg = msg_xbp[0]
 			bp_short_desc = FbXml.get_cnode_text(xmsg, 'ShortDescription', clean=True)
-			bp_long_desc = FbXml.get_cnode_text(xmsg, 'LongDescription', clean=True)
-			bp_details = FbXml.get_cnode_text(xmsg, 'Details')
-			bp_pattern_index = plg_xbp.getparent().index(plg_xbp) + 1
-			bp_message_index = xmsg.getparent().index(xmsg) + 1
+			bp_pattern_index = plg_positions[plg_xbp]
+			bp_message_index = msg_positions[xmsg]
 			
-			pattern = FindBugsPlugin.BugPattern(bp_name, bp_abbr, bp_cat_name, bp_is_exp, bp_short_desc, bp_long_desc, bp_details, bp_cweid)
+			pattern = FindBugsPlugin.BugPattern(bp_name, bp_abbr, bp_cat_name, bp_is_exp, bp_short_desc, None, None, bp_cweid)
 			pattern.is_deprecated = bp_is_old
 			pattern.pattern_index = bp_pattern_index
 			pattern.message_index = bp_message_index
+			pattern._xmsg = xmsg
 			patterns[bp_name] = pattern
 		
+		plg_xbcs = FindBugsPlugin._index_nodes(FindBugsPlugin._XP_PLG_CODES(plg_xtree), 'abbrev')
 		codes = {}
-		for msg_xbc in msg_xtree.xpath('/MessageCollection/BugCode'):
+		for msg_xbc in FindBugsPlugin._XP_MSG_CODES(msg_xtree):
 			bc_name = FbXml.get_attr_value(msg_xbc, 'abbrev')
 			if not bc_name: continue
 			if bc_name in codes: continue
 			bc_desc = FbXml.get_node_text(msg_xbc)
-			plg_xbc = plg_xtree.xpath('/FindbugsPlugin/BugCode[@abbrev="%s"]' % bc_name)
+			plg_xbc = plg_xbcs.get(bc_name, [])
 			if len(plg_xbc) == 1:
 				bc_cweid = FbUtils.parse_int(FbXml.get_attr_value(plg_xbc[0], 'cweid'))
 			else:
@@ -217,10 +308,193 @@ class FindBugsPlugin():
 			code = FindBugsPlugin.BugCode(bc_name, bc_desc, bc_cweid)
 			codes[bc_name] = code
 		
+		return FindBugsPlugin(head, categories, patterns, codes)
+	
+	@staticmethod
+	def _parse_stream(findbugs_xml, messages_xml):
+		plugin_id = provider = website = ''
+		plg_cats = []
+		plg_bps = []
+		plg_bcs = {}
+		is_plg_root = False
+		for position, xnode in FbXml.iter_children(findbugs_xml):
+			if position == 0:
+				plugin_id = FbXml.get_attr_value(xnode, 'pluginid')
+				if not plugin_id:
+					raise Exception('pluginid attribute not found in root node')
+				provider = FbXml.get_attr_value(xnode, 'provider')
+				website = FbXml.get_attr_value(xnode, 'website')
+				is_plg_root = (xnode.tag == 'FindbugsPlugin')
+				continue
+			if not is_plg_root:
+				continue
+			if xnode.tag == 'BugCategory':
+				cat_name = FbXml.get_attr_value(xnode, 'category')
+				if not cat_name: continue
+				is_hidden = (FbXml.get_attr_value(xnode, 'hidden').lower() == 'true')
+				plg_cats.append((cat_name, is_hidden))
+			elif xnode.tag == 'BugPattern':
+				bp_name = FbXml.get_attr_value(xnode, 'type')
+				if not bp_name: continue
+				bp_abbr = FbXml.get_attr_value(xnode, 'abbrev')
+				bp_cat_name = FbXml.get_attr_value(xnode, 'category')
+				bp_cweid = FbUtils.parse_int(FbXml.get_attr_value(xnode, 'cweid'))
+				bp_is_exp = (FbXml.get_attr_value(xnode, 'experimental').lower() == 'true')
+				bp_is_old = (FbXml.get_attr_value(xnode, 'deprecated').lower() == 'true')
+				plg_bps.append((bp_name, bp_abbr, bp_cat_name, bp_is_exp, bp_is_old, bp_cweid, position))
+			elif xnode.tag == 'BugCode':
+				bc_name = xnode.get('abbrev')
+				if bc_name is None: continue
+				plg_bcs.setdefault(bc_name, []).append(FbXml.get_attr_value(xnode, 'cweid'))
+		
+		categories = {}
+		for cat_name, is_hidden in plg_cats:
+			if cat_name in categories: continue
+			category = FindBugsPlugin.BugCategory(cat_name)
+			category.is_hidden = is_hidden
+			categories[cat_name] = category
+		
+		bp_names = set(bp[0] for bp in plg_bps)
+		xplugins = []
+		msg_bps = {}
+		msg_counts = {}
+		codes = {}
+		is_msg_root = False
+		for position, xnode in FbXml.iter_children(messages_xml):
+			if position == 0:
+				is_msg_root = (xnode.tag == 'MessageCollection')
+				continue
+			if not is_msg_root:
+				continue
+			if xnode.tag == 'Plugin':
+				description = FbXml.get_cnode_text(xnode, 'ShortDescription', clean=True)
+				details = FbXml.get_cnode_text(xnode, 'Details')
+				xplugins.append((description, details))
+			elif xnode.tag == 'BugCategory':
+				cat_name = FbXml.get_attr_value(xnode, 'category')
+				if not cat_name: continue
+				if cat_name in categories:
+					category = categories[cat_name]
+				else:
+					category = FindBugsPlugin.BugCategory(cat_name)
+				abbr = FbXml.get_cnode_text(xnode, 'Abbreviation')
+				description = FbXml.get_cnode_text(xnode, 'Description')
+				details = FbXml.get_cnode_text(xnode, 'Details', clean=True)
+				if abbr: category.abbr = abbr
+				if description: category.description = description
+				if details: category.details = details
+				categories[cat_name] = category
+			elif xnode.tag == 'BugPattern':
+				bp_name = xnode.get('type')
+				if bp_name not in bp_names: continue
+				msg_counts[bp_name] = msg_counts.get(bp_name, 0) + 1
+				if bp_name in msg_bps: continue
+				bp_short_desc = FbXml.get_cnode_text(xnode, 'ShortDescription', clean=True)
+				bp_long_desc = FbXml.get_cnode_text(xnode, 'LongDescription', clean=True)
+				bp_details = FbXml.get_cnode_text(xnode, 'Details')
+				msg_bps[bp_name] = (bp_short_desc, bp_long_desc, bp_details, position)
+			elif xnode.tag == 'BugCode':
+				bc_name = FbXml.get_attr_value(xnode, 'abbrev')
+				if not bc_name: continue
+				if bc_name in codes: continue
+				bc_desc = FbXml.get_node_text(xnode)
+				plg_bc = plg_bcs.get(bc_name, [])
+				if len(plg_bc) == 1:
+					bc_cweid = FbUtils.parse_int(plg_bc[0])
+				else:
+					bc_cweid = 0
+				codes[bc_name] = FindBugsPlugin.BugCode(bc_name, bc_desc, bc_cweid)
+		
+		if len(xplugins) != 1:
+			raise Exception('could not find plugin description')
+		description, details = xplugins[0]
+		head = FindBugsPlugin.Head(plugin_id, provider, website, description, details)
+		
+		patterns = {}
+		for bp_name, bp_abbr, bp_cat_name, bp_is_exp, bp_is_old, bp_cweid, bp_pattern_index in plg_bps:
+			if msg_counts.get(bp_name, 0) != 1:
+				raise Exception('could not find message for bug pattern "%s"' % bp_name)
+			bp_short_desc, bp_long_desc, bp_details, bp_message_index = msg_bps[bp_name]
+			pattern = FindBugsPlugin.BugPattern(bp_name, bp_abbr, bp_cat_name, bp_is_exp, bp_short_desc, bp_long_desc, bp_details, bp_cweid)
+			pattern.is_deprecated = bp_is_old
+			pattern.pattern_index = bp_pattern_index
+			pattern.message_index = bp_message_index
+			patterns[bp_name] = pattern
+		
+		return FindBugsPlugin(head, categories, patterns, codes)
+	
+	def _to_data(self):
+		head = self.head
+		categories = [(c.name, c.is_hidden, c.abbr, c.description, c.details) for c in self.categories.values()]
+		patterns = [(p.name, p.abbr, p.category_name, p.is_experimental, p.is_deprecated, p.short_desc, p.long_desc, p.details, p.cweid, p.pattern_index, p.message_index) for p in sorted(self.patterns.values(), key=lambda p: p.pattern_index)]
+		codes = [(c.name, c.description, c.cweid) for c in self.codes.values()]
+		ranker = [(s._adjustment, s._relative) for s in (self.ranker.patterns, self.ranker.kinds, self.ranker.categories)]
+		return ((head.plugin_id, head.provider, head.website, head.description, head.details), categories, patterns, codes, ranker)
+	
+	@staticmethod
+	def _from_data(data):
+		head_data, categories_data, patterns_data, codes_data, ranker_data = data
+		head = FindBugsPlugin.Head(*head_data)
+		categories = {}
+		for name, is_hidden, abbr, description, details in categories_data:
+			category = FindBugsPlugin.BugCategory(name, abbr, description, details)
+			category.is_hidden = is_hidden
+			categories[name] = category
+		patterns = {}
+		for name, abbr, category_name, is_exp, is_old, short_desc, long_desc, details, cweid, pattern_index, message_index in patterns_data:
+			pattern = FindBugsPlugin.BugPattern(name, abbr, category_name, is_exp, short_desc, long_desc, details, cweid)
+			pattern.is_deprecated = is_old
+			pattern.pattern_index = pattern_index
+			pattern.message_index = message_index
+			patterns[name] = pattern
+		codes = {}
+		for name, description, cweid in codes_data:
+			codes[name] = FindBugsPlugin.BugCode(name, description, cweid)
 		plugin = FindBugsPlugin(head, categories, patterns, codes)
+		scorers = []
+		for adjustment, relative in ranker_data:
+			scorer = FindBugsPlugin.BugRanker.Scorer()
+			scorer._adjustment = adjustment
+			scorer._relative = relative
+			scorers.append(scorer)
+		plugin.ranker = FindBugsPlugin.BugRanker(*scorers)
+		return plugin
+	
+	@staticmethod
+	@Stats.timed('fb.parse')
+	def parse(etc_dir, stream=False, cache=None):
+		etc_dir = FbUtils.get_dir(etc_dir)
+		if Archive.is_archive(etc_dir):
+			conf_dir = FindBugsPlugin.find_conf_dir(etc_dir)
+			if conf_dir is None:
+				raise Exception('"%s" does not contain findbugs.xml and messages.xml' % etc_dir)
+			etc_dir = conf_dir
+		if not Archive.isdir(etc_dir):
+			raise Exception('"%s" does not exist' % etc_dir)
+		findbugs_xml = FbUtils.get_file('findbugs.xml', etc_dir)
+		messages_xml = FbUtils.get_file('messages.xml', etc_dir)
+		if not Archive.isfile(findbugs_xml):
+			raise Exception('"%s" does not exist' % findbugs_xml)
+		if not Archive.isfile(messages_xml):
+			raise Exception('"%s" does not exist' % messages_xml)
 		bugrank_file = FbUtils.get_file('bugrank.txt', etc_dir)
-		if os.path.isfile(bugrank_file):
+		
+		if cache is not None:
+			cache_key = cache.get_key('FindBugsPlugin', [findbugs_xml, messages_xml, bugrank_file])
+			data = cache.load(cache_key)
+			if data is not None:
+				return FindBugsPlugin._from_data(data)
+		
+		with Stats.phase('fb.parse.xml'):
+			if stream:
+				plugin = FindBugsPlugin._parse_stream(Archive.get_source(findbugs_xml), Archive.get_source(messages_xml))
+			else:
+				plugin = FindBugsPlugin._parse_tree(Archive.get_source(findbugs_xml), Archive.get_source(messages_xml))
+		if Archive.isfile(bugrank_file):
 			plugin.load_ranker(etc_dir)
+		
+		if cache is not None:
+			cache.store(cache_key, plugin._to_data())
 		return plugin
 	
 	def load_ranker(self, rank_dir):
@@ -242,7 +516,8 @@ class FindBugsPlugin():
 			self.description = description
 			self.details = details
 		
-		def _get_short_id(self, plugin_id):
+		@staticmethod
+		def _get_short_id(plugin_id):
 			dot = plugin_id.rindex('.')
 			if dot > 0:
 				short_id = plugin_id[dot+1:]
@@ -264,7 +539,7 @@ class FindBugsPlugin():
 				raise Exception('pluginid attribute not found in root node')
 			provider = FbXml.get_attr_value(xroot, 'provider')
 			website = FbXml.get_attr_value(xroot, 'website')
-			xplugins = msg_xtree.xpath('/MessageCollection/Plugin')
+			xplugins = FindBugsPlugin._XP_MSG_PLUGIN(msg_xtree)
 			if len(xplugins) != 1:
 				raise Exception('could not find plugin description')
 			xplugin = xplugins[0]
@@ -273,10 +548,12 @@ class FindBugsPlugin():
 			head = FindBugsPlugin.Head(plugin_id, provider, website, description, details)
 			return head
 	
-	class BugCategory():
+	class BugCategory(object):
+		__slots__ = ('is_hidden', 'name', 'abbr', 'description', 'details')
+		
 		def __init__(self, name, abbr=None, description=None, details=None):
 			self.is_hidden = False
-			self.name = name
+			self.name = FbUtils.get_interned(name)
 			self.abbr = abbr
 			self.description = description
 			self.details = details
@@ -287,23 +564,63 @@ class FindBugsPlugin():
 			if self.description: attr += ', description="%s"' % self.description
 			return "BugCategory(%s)" % (attr)
 	
-	class BugPattern():
+	class BugPattern(object):
+		__slots__ = ('name', 'abbr', 'category_name', 'is_experimental', 'is_deprecated', 'short_desc', '_long_desc', '_details', '_xmsg', 'cweid', 'pattern_index', 'message_index')
+		FINGERPRINT_FIELDS = ('category_name', 'is_experimental', 'is_deprecated', 'cweid', 'short_desc', 'details')
+		
 		def __init__(self, name, abbr, category_name, is_experimental, short_desc, long_desc, details, cweid):
 			self.name = name
-			self.abbr = abbr
-			self.category_name = category_name
+			self.abbr = FbUtils.get_interned(abbr)
+			self.category_name = FbUtils.get_interned(category_name)
 			self.is_experimental = is_experimental
 			self.is_deprecated = False
 			self.short_desc = short_desc
-			self.long_desc = long_desc
-			self.details = details
+			self._long_desc = long_desc
+			self._details = details
+			self._xmsg = None
 			self.cweid = cweid
 			self.pattern_index = 0
 			self.message_index = 0
 		
+		def _load(self):
+			"""Read long description and details from the retained messages.xml node."""
+			xmsg = self._xmsg
+			if xmsg is None:
+				return
+			self._xmsg = None
+			self._long_desc = FbXml.get_cnode_text(xmsg, 'LongDescription', clean=True)
+			self._details = FbXml.get_cnode_text(xmsg, 'Details')
+		
+		@property
+		def long_desc(self):
+			self._load()
+			return self._long_desc
+		
+		@long_desc.setter
+		def long_desc(self, value):
+			self._load()
+			self._long_desc = value
+		
+		@property
+		def details(self):
+			self._load()
+			return self._details
+		
+		@details.setter
+		def details(self, value):
+			self._load()
+			self._details = value
+		
 		def get_rank(self, rankers):
 			return FindBugsPlugin.BugRanker.rank_pattern(self, rankers)
 		
+		def get_fingerprint(self, rank = None):
+			"""Maps each fingerprint field, and rank when given, to a content hash"""
+			fingerprint = dict((name, FbUtils.get_hash(getattr(self, name))) for name in FindBugsPlugin.BugPattern.FINGERPRINT_FIELDS)
+			if rank is not None:
+				fingerprint['rank'] = FbUtils.get_hash(rank)
+			return fingerprint
+		
 		def __repr__(self):
 			attr = 'name=%s' % self.name
 			if self.abbr: attr += ', abbr=%s' % self.abbr
@@ -311,9 +628,11 @@ class FindBugsPlugin():
 			if self.short_desc: attr += ', short_desc="%s"' % self.short_desc
 			return "BugPattern(%s)" % (attr)
 	
-	class BugCode():
+	class BugCode(object):
+		__slots__ = ('name', 'description', 'cweid')
+		
 		def __init__(self, name, description, cweid):
-			self.name = name
+			self.name = FbUtils.get_interned(name)
 			self.description = description
 			self.cweid = cweid
 		
@@ -375,13 +694,34 @@ class FindBugsPlugin():
 			return FindBugsPlugin.BugRanker._adjust_rank(rank, priority)
 		
 		@staticmethod
+		@Stats.timed('fb.rank.merge')
+		def merge(rankers):
+			"""Fold a stack of rankers into a RankTable that ranks like rank_pattern"""
+			rankers = [r for r in rankers if r]
+			levels = []
+			for scorers in ([r.patterns for r in rankers], [r.kinds for r in rankers], [r.categories for r in rankers]):
+				table = {}
+				for key in set(k for s in scorers for k in s._adjustment):
+					rank = 0
+					final = False
+					for s in scorers:
+						rank += s.get(key)
+						if not s.is_relative(key):
+							final = True
+							break
+					table[key] = (rank, final)
+				levels.append(table)
+			return FindBugsPlugin.BugRanker.RankTable(*levels)
+		
+		@staticmethod
+		@Stats.timed('fb.rank.parse')
 		def parse(rank_dir):
 			rank_dir = FbUtils.get_dir(rank_dir)
-			if not os.path.isdir(rank_dir):
+			if not Archive.isdir(rank_dir):
 				raise Exception('"%s" does not exist' % rank_dir)
 			bugrank_path = FbUtils.get_file('bugrank.txt', rank_dir)
 			adjust_bugrank_path = FbUtils.get_file('adjustBugrank.txt', rank_dir)
-			if not os.path.isfile(bugrank_path):
+			if not Archive.isfile(bugrank_path):
 				raise Exception('"%s" does not exist' % bugrank_path)
 			#if not os.path.isfile(adjust_bugrank_path):
 			#	raise Exception('"%s" does not exist' % adjust_bugrank_path)
@@ -390,7 +730,7 @@ class FindBugsPlugin():
 			kinds = FindBugsPlugin.BugRanker.Scorer()
 			categories = FindBugsPlugin.BugRanker.Scorer()
 			
-			f = open(bugrank_path, 'r')
+			f = Archive.open(bugrank_path, 'r')
 			for line in f:
 				line = line.strip()
 				if len(line) == 0 or line.startswith('#'): 
@@ -416,6 +756,39 @@ class FindBugsPlugin():
 			attr = 'patterns=%d, kinds=%d, categories=%d' % (len(self.patterns), len(self.kinds), len(self.categories))
 			return "BugRanker(%s)" % attr
 		
+		class RankTable(object):
+			__slots__ = ('patterns', 'kinds', 'categories')
+			_UNRANKED = (0, False)
+			
+			def __init__(self, patterns, kinds, categories):
+				self.patterns = patterns
+				self.kinds = kinds
+				self.categories = categories
+			
+			def rank(self, pattern):
+				unranked = self._UNRANKED
+				rank, final = self.patterns.get(pattern.name, unranked)
+				if final:
+					return rank
+				adjustment, final = self.kinds.get(pattern.abbr, unranked)
+				rank += adjustment
+				if final:
+					return rank
+				adjustment, final = self.categories.get(pattern.category_name, unranked)
+				rank += adjustment
+				if final:
+					return rank
+				priority = FindBugsPlugin.BugRanker._get_priority(pattern)
+				return FindBugsPlugin.BugRanker._adjust_rank(rank, priority)
+			
+			def rank_all(self, patterns):
+				rank = self.rank
+				return dict((p.name, rank(p)) for p in patterns)
+			
+			def __repr__(self):
+				attr = 'patterns=%d, kinds=%d, categories=%d' % (len(self.patterns), len(self.kinds), len(self.categories))
+				return "RankTable(%s)" % attr
+		
 		class Scorer():
 			def __init__(self):
 				self._adjustment = {}
@@ -26,10 +26,6 @@
 from __future__ import print_function
 import sys, os, re, signal
 import click
-from lxml import etree
-
-from fb import FindBugsPlugin
-from sq import SonarQube
 
 signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
@@ -45,18 +41,92 @@ def _file(p, root = None):
 		root = os.path.dirname(os.path.realpath(__file__))
 	return os.path.realpath(os.path.join(root, p))
 
+def _cache(cache_dir, cache_size):
+	if cache_dir is None:
+		return None
+	from cache import ParseCache
+	return ParseCache(cache_dir, cache_size * 1024 * 1024)
+
+def _catalog(db_file):
+	if db_file is None:
+		return None
+	from catalog import RuleCatalog
+	return RuleCatalog(db_file)
+
+def _load_plugin(fb_etc_dir, stream, cache, catalog):
+	from fb import FindBugsPlugin
+	fb_plugin = None
+	if catalog is not None:
+		fb_plugin = catalog.load_plugin(fb_etc_dir)
+	if fb_plugin is None:
+		fb_plugin = FindBugsPlugin.parse(fb_etc_dir, stream, cache)
+	return fb_plugin
+
+def _load_rules(sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, stream, cache, catalog):
+	from sq import SonarQube
+	sq_rules = None
+	if catalog is not None:
+		sq_rules = catalog.load_rules(sq_rules_file)
+	if sq_rules is None:
+		sq_rules = SonarQube.Rules.parse(sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, stream, cache)
+	return sq_rules
+
+def _load_profile(sq_profile_file, catalog):
+	from sq import SonarQube
+	sq_profile = None
+	if catalog is not None:
+		sq_profile = catalog.load_profile(sq_profile_file)
+	if sq_profile is None:
+		sq_profile = SonarQube.RulesProfile.parse(sq_profile_file)
+	return sq_profile
+
+def _sq_dirs(sq_rules_dir):
+	sq_ruleprop_dir = os.path.realpath(os.path.join(sq_rules_dir, '..', '..', 'l10n'))
+	sq_rulehtml_dir = os.path.realpath(os.path.join(sq_ruleprop_dir, 'findbugs', 'rules', 'findbugs'))
+	return sq_ruleprop_dir, sq_rulehtml_dir
+
+def _sq_files(sq_rules_dir, plugin_id):
+	from sq import SonarQube
+	sq_rules_file = SonarQube.Rules.get_file(sq_rules_dir, plugin_id)
+	sq_ruleprop_dir, sq_rulehtml_dir = _sq_dirs(sq_rules_dir)
+	sq_profile_file = None
+	sq_ruleprop_file = None
+	if plugin_id == 'core':
+		sq_profile_file = os.path.join(sq_rules_dir, 'profile-findbugs.xml')
+		sq_ruleprop_file = os.path.join(sq_ruleprop_dir, 'findbugs.properties')
+	return sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, sq_profile_file
+
+def _run(stats, profile, name, func, *args):
+	if not stats and not profile:
+		return func(*args)
+	from stats import Stats
+	if stats:
+		Stats.start()
+	try:
+		with Stats.phase(name):
+			if profile:
+				return Stats.profile(func, profile, *args)
+			else:
+				return func(*args)
+	finally:
+		if stats:
+			Stats.write(Stats.stop())
+
 def _priority_sortlevel(priority):
 	if priority == '-': return 100
+	from sq import SonarQube
 	return SonarQube.RulePriority.get_level(priority)
 
 def output(patterns, rankers, sq_rules = None):
 	max_key_len = 1
 	max_cat_len = 1
 	ranks = {}
+	from fb import FindBugsPlugin
+	rank_table = FindBugsPlugin.BugRanker.merge(rankers)
 	for key, pattern in patterns.items():
 		max_key_len = max(max_key_len, len(key))
 		max_cat_len = max(max_cat_len, len(pattern.category_name))
-		rank = pattern.get_rank(rankers)
+		rank = rank_table.rank(pattern)
 		if sq_rules and pattern.name in sq_rules:
 			priority = sq_rules[pattern.name].priority
 		else:
@@ -71,11 +141,33 @@ def output(patterns, rankers, sq_rules = None):
 		p = ranked['pattern']
 		_out(fmt.format(ranked['rank'], ranked['priority'], p.category_name, p.name, p.short_desc))
 
-def extract(fb_plugin_dir, sq_plugin_dir):
+def list_rules(fb_plugin_dirs, sq_plugin_dir = None, stream = False, cache = None, catalog = None):
+	from fb import FindBugsPlugin
+	fb_plugins = []
+	for path in fb_plugin_dirs:
+		fb_etc_dir = FindBugsPlugin.find_conf_dir(path)
+		if fb_etc_dir is None:
+			raise click.UsageError('Invalid plugin directory: %s ' % path)
+		fb_plugin = _load_plugin(fb_etc_dir, stream, cache, catalog)
+		fb_plugins.append(fb_plugin)
+	sq_rules = None
+	if sq_plugin_dir is not None:
+		from sq import SonarQube
+		sq_rules_dir = SonarQube.Rules.find_dir(sq_plugin_dir)
+		sq_rules_file = SonarQube.Rules.get_file(sq_rules_dir, fb_plugin.head.short_id)
+		sq_rules = _load_rules(sq_rules_file, None, None, stream, cache, catalog)
+	patterns = fb_plugins[-1].patterns
+	rankers = [p.ranker for p in fb_plugins]
+	output(patterns, rankers, sq_rules)
+
+def extract(fb_plugin_dir, sq_plugin_dir, stream = False, cache = None, catalog = None):
+	from fb import FindBugsPlugin
+	from sq import SonarQube
+	from archive import Archive
 	fb_etc_dir = FindBugsPlugin.find_conf_dir(fb_plugin_dir)
 	if fb_etc_dir is None:
 		raise click.UsageError('Invalid FindBugs plugin directory: %s ' % fb_plugin_dir)
-	fb_plugin = FindBugsPlugin.parse(fb_etc_dir)
+	fb_plugin = _load_plugin(fb_etc_dir, stream, cache, catalog)
 	plugin_id = fb_plugin.head.short_id
 	if plugin_id not in ['core', 'fbcontrib', 'findsecbugs']:
 		raise click.UsageError('Unknown FindBugs plugin: %s ' % fb_plugin.head.plugin_id)
@@ -83,20 +175,10 @@ def extract(fb_plugin_dir, sq_plugin_dir):
 	if sq_rules_dir is None:
 		raise click.UsageError('Invalid SonarQube plugin directory: %s ' % fb_plugin_dir)
 	
-	sq_rules_file = SonarQube.Rules.get_file(sq_rules_dir, fb_plugin.head.short_id)
-	sq_profile_dir = sq_rules_dir
-	sq_ruleprop_dir = os.path.realpath(os.path.join(sq_rules_dir, '..', '..', 'l10n'))
-	sq_rulehtml_dir = os.path.realpath(os.path.join(sq_ruleprop_dir, 'findbugs', 'rules', 'findbugs'))
-	
-	sq_profile_file = None
-	sq_ruleprop_file = None
-	if plugin_id == 'core':
-		sq_profile_file = os.path.join(sq_rules_dir, 'profile-findbugs.xml')
-		sq_ruleprop_file = os.path.join(sq_ruleprop_dir, 'findbugs.properties')
-	
-	sq_rules = SonarQube.Rules.parse(sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir)
-	if sq_profile_file is not None and os.path.isfile(sq_profile_file):
-		sq_profile = SonarQube.RulesProfile.parse(sq_profile_file)
+	sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, sq_profile_file = _sq_files(sq_rules_dir, plugin_id)
+	sq_rules = _load_rules(sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, stream, cache, catalog)
+	if sq_profile_file is not None and Archive.isfile(sq_profile_file):
+		sq_profile = _load_profile(sq_profile_file, catalog)
 	else:
 		sq_profile = None
 	
@@ -164,22 +246,219 @@ def extract(fb_plugin_dir, sq_plugin_dir):
 			output = output[:-1]
 		_out(output)
 
+def _get_fingerprints(fb_plugin):
+	from fb import FindBugsPlugin
+	rank_table = FindBugsPlugin.BugRanker.merge([fb_plugin.ranker])
+	return dict((name, p.get_fingerprint(rank_table.rank(p))) for name, p in fb_plugin.patterns.items())
+
+def diff(old_plugin_dir, new_plugin_dir, stream = False, cache = None, catalog = None):
+	from fb import FindBugsPlugin
+	fingerprints = []
+	for path in [old_plugin_dir, new_plugin_dir]:
+		fb_etc_dir = FindBugsPlugin.find_conf_dir(path)
+		if fb_etc_dir is None:
+			raise click.UsageError('Invalid FindBugs plugin directory: %s ' % path)
+		fingerprints.append(_get_fingerprints(_load_plugin(fb_etc_dir, stream, cache, catalog)))
+	old, new = fingerprints
+	changes = 0
+	_out('# change:rule_key:fields')
+	for name in sorted(set(old) | set(new)):
+		if not name in new:
+			_out('removed:{0}'.format(name))
+		elif not name in old:
+			_out('added:{0}'.format(name))
+		else:
+			old_fp, new_fp = old[name], new[name]
+			fields = [k for k in sorted(new_fp) if old_fp.get(k) != new_fp[k]]
+			if len(fields) == 0:
+				continue
+			_out('changed:{0}:{1}'.format(name, ','.join(fields)))
+		changes += 1
+	return changes
+
+def import_catalog(catalog, fb_plugin_dirs = (), sq_plugin_dirs = (), data_files = (), stream = False):
+	from fb import FindBugsPlugin
+	from sq import SonarQube
+	from archive import Archive
+	for path in fb_plugin_dirs:
+		fb_etc_dir = FindBugsPlugin.find_conf_dir(path)
+		if fb_etc_dir is None:
+			raise click.UsageError('Invalid FindBugs plugin directory: %s ' % path)
+		fb_plugin = catalog.import_plugin(fb_etc_dir, stream)
+		_out('{0}: {1} patterns'.format(fb_etc_dir, len(fb_plugin.patterns)))
+	for path in sq_plugin_dirs:
+		sq_rules_dir = SonarQube.Rules.find_dir(path)
+		if sq_rules_dir is None:
+			raise click.UsageError('Invalid SonarQube plugin directory: %s ' % path)
+		for plugin_id in ['core', 'fbcontrib', 'findsecbugs']:
+			sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, sq_profile_file = _sq_files(sq_rules_dir, plugin_id)
+			if not Archive.isfile(sq_rules_file):
+				continue
+			sq_rules = catalog.import_rules(sq_rules_file, sq_ruleprop_file, sq_rulehtml_dir, stream)
+			_out('{0}: {1} rules'.format(sq_rules_file, len(sq_rules)))
+			if sq_profile_file is not None and Archive.isfile(sq_profile_file):
+				sq_profile = catalog.import_profile(sq_profile_file)
+				_out('{0}: {1} rules'.format(sq_profile_file, len(sq_profile)))
+	for path in data_files:
+		rows = catalog.import_data_file(path)
+		_out('{0}: {1} rows'.format(path, rows))
+
+def _build_dir():
+	root = os.path.dirname(os.path.realpath(__file__))
+	if os.path.isfile(root):
+		# bundled as build/fbrules.pyz, the bundle already lives in the build directory
+		root = os.path.dirname(root)
+		if os.path.basename(root) == 'build':
+			return root
+	return os.path.join(root, 'build')
+
+def _file_hash(p):
+	import hashlib
+	h = hashlib.sha1()
+	with open(p, 'rb') as fh:
+		for chunk in iter(lambda: fh.read(65536), b''):
+			h.update(chunk)
+	return h.hexdigest()
+
+def _deploy_file(task):
+	"""Copies src to dst through a temporary file unless their contents are equal."""
+	import shutil, tempfile
+	src, dst, mode = task
+	if os.path.isfile(dst):
+		if os.path.getsize(src) == os.path.getsize(dst) and _file_hash(src) == _file_hash(dst):
+			return False
+		mode = os.stat(dst).st_mode & 0o7777
+	dst_dir, dst_name = os.path.split(dst)
+	fd, tmp = tempfile.mkstemp(prefix='.%s.' % dst_name, suffix='.tmp', dir=dst_dir)
+	try:
+		with os.fdopen(fd, 'wb') as fh:
+			with open(src, 'rb') as src_fh:
+				shutil.copyfileobj(src_fh, fh)
+		os.chmod(tmp, mode)
+		getattr(os, 'replace', os.rename)(tmp, dst)
+	except BaseException:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		raise
+	return True
+
+def deploy(sq_plugin_dir, build_dir = None, jobs = 8, delete = False):
+	import fnmatch
+	from sq import SonarQube
+	sq_rules_dir = SonarQube.Rules.find_dir(sq_plugin_dir)
+	if sq_rules_dir is None:
+		raise click.UsageError('Invalid SonarQube plugin directory: %s ' % sq_plugin_dir)
+	sq_ruleprop_dir, sq_rulehtml_dir = _sq_dirs(sq_rules_dir)
+	for path in [sq_ruleprop_dir, sq_rulehtml_dir]:
+		if not os.path.isdir(path):
+			raise click.UsageError('Directory not found: %s ' % path)
+	build_dir = build_dir or _build_dir()
+	umask = os.umask(0)
+	os.umask(umask)
+	mode = 0o666 & ~umask
+	tasks = []
+	if os.path.isdir(build_dir):
+		for fn in sorted(os.listdir(build_dir)):
+			if fnmatch.fnmatch(fn, 'rules*.xml') or fn == 'profile-findbugs.xml':
+				dst_dir = sq_rules_dir
+			elif fn == 'findbugs.properties':
+				dst_dir = sq_ruleprop_dir
+			else:
+				continue
+			tasks.append((os.path.join(build_dir, fn), os.path.join(dst_dir, fn), mode))
+	html_dir = os.path.join(build_dir, 'html', 'findbugs')
+	html_files = set()
+	if os.path.isdir(html_dir):
+		for fn in sorted(os.listdir(html_dir)):
+			if not fn.endswith('.html'): continue
+			html_files.add(fn)
+			tasks.append((os.path.join(html_dir, fn), os.path.join(sq_rulehtml_dir, fn), mode))
+	if jobs > 1 and len(tasks) > 1:
+		from multiprocessing.pool import ThreadPool
+		pool = ThreadPool(min(jobs, len(tasks)))
+		try:
+			copied = pool.map(_deploy_file, tasks)
+		finally:
+			pool.close()
+			pool.join()
+	else:
+		copied = [_deploy_file(task) for task in tasks]
+	removed = 0
+	if delete and os.path.isdir(html_dir):
+		for fn in sorted(os.listdir(sq_rulehtml_dir)):
+			if fn.endswith('.html') and not fn in html_files:
+				os.remove(os.path.join(sq_rulehtml_dir, fn))
+				removed += 1
+	_out('{0} copied, {1} skipped, {2} removed'.format(sum(copied), len(copied) - sum(copied), removed))
+
+def _rules_files(path):
+	import fnmatch
+	from sq import SonarQube
+	from archive import Archive
+	if Archive.isfile(path) and not Archive.is_archive(path):
+		return [path]
+	rules_dir = SonarQube.Rules.find_dir(path) or path
+	names = fnmatch.filter(Archive.listdir(rules_dir), 'rules*.xml')
+	return [os.path.join(rules_dir, fn) for fn in sorted(names) if Archive.isfile(os.path.join(rules_dir, fn))]
+
+def duplicates(paths, fb_plugin_dirs = ()):
+	from fb import FindBugsPlugin, FbUtils
+	from sq import SonarQube
+	index = SonarQube.RuleKeys()
+	for path in fb_plugin_dirs:
+		fb_etc_dir = FindBugsPlugin.find_conf_dir(path)
+		if fb_etc_dir is None:
+			raise click.UsageError('Invalid FindBugs plugin directory: %s ' % path)
+		findbugs_xml = FbUtils.get_file('findbugs.xml', fb_etc_dir)
+		for short_id, position, name in FindBugsPlugin.iter_pattern_names(fb_etc_dir):
+			index.add(name, short_id, findbugs_xml, position)
+	for path in paths:
+		for rules_xml in _rules_files(path):
+			index.add_rules(rules_xml)
+	collisions = index.get_duplicates()
+	_out('# rule_key:plugin:file:position')
+	for key, locations in collisions:
+		for plugin_id, file_name, position in locations:
+			_out('{0}:{1}:{2}:{3}'.format(key, plugin_id, file_name, position))
+	return len(collisions)
+
+class _ArchivePath(click.Path):
+	"""click.Path which also accepts '<archive>!/<member>' paths."""
+	def convert(self, value, param, ctx):
+		if not '!' in value:
+			return click.Path.convert(self, value, param, ctx)
+		from archive import Archive
+		archive_file, member = Archive.split(value)
+		if archive_file is None:
+			return click.Path.convert(self, value, param, ctx)
+		path = Archive.join(click.Path.convert(self, archive_file, param, ctx), member)
+		if not Archive.isfile(path) and not Archive.isdir(path):
+			self.fail('Path "%s" does not exist.' % value, param, ctx)
+		return path
 
 class CmdLine():
 	CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 	_type_dir = click.Path(exists=True, file_okay=False, dir_okay=True, readable=True, resolve_path=True)
 	_type_rofile = click.Path(exists=True, file_okay=True, dir_okay=False, readable=True, resolve_path=True)
 	_type_rwfile = click.Path(exists=False, file_okay=True, dir_okay=False, writable=True, resolve_path=True)
+	_type_wdir = click.Path(exists=False, file_okay=False, dir_okay=True, writable=True, resolve_path=True)
+	_type_ropath = _ArchivePath(exists=True, file_okay=True, dir_okay=True, readable=True, resolve_path=True)
 	
 	@click.group(context_settings=CONTEXT_SETTINGS)
 	def main():
 		pass
 	
 	@main.command(context_settings=CONTEXT_SETTINGS, short_help='list rules (rank, priority, category, etc)')
-	@click.argument('fb_plugin_dir', metavar='<fb_plugin_dir> ...', type=_type_dir, nargs=-1)
-	@click.option('-s', metavar='<sq_plugin_dir>', type=_type_dir, required=False, help='SonarQube FindBugs plugin directory')
+	@click.argument('fb_plugin_dir', metavar='<fb_plugin_dir> ...', type=_type_ropath, nargs=-1)
+	@click.option('-s', metavar='<sq_plugin_dir>', type=_type_ropath, required=False, help='SonarQube FindBugs plugin directory')
+	@click.option('--stream', is_flag=True, help='parse XML files incrementally')
+	@click.option('--cache-dir', metavar='<dir>', type=_type_wdir, required=False, help='cache parsed rules in directory')
+	@click.option('--cache-size', metavar='<mb>', type=int, default=64, help='maximum cache size in megabytes')
+	@click.option('--db', metavar='<db_file>', type=_type_rofile, required=False, help='read imported plugins and rules from a rule catalog')
+	@click.option('--stats', is_flag=True, help='print a JSON report of phase timings and counters to stderr')
+	@click.option('--profile', metavar='<file>', type=_type_rwfile, required=False, help='write a cProfile dump')
 	@click.pass_context
-	def list(ctx, fb_plugin_dir, s):
+	def list(ctx, fb_plugin_dir, s, stream, cache_dir, cache_size, db, stats, profile):
 		"""List FindBugs rules with ranking, priority, category, etc.
 		
 		\b
@@ -187,34 +466,105 @@ class CmdLine():
 		 """
 		if not len(fb_plugin_dir) > 0:
 			_err(ctx.get_help())
-		fb_plugins = []
-		for path in fb_plugin_dir:
-			fb_etc_dir = FindBugsPlugin.find_conf_dir(path)
-			if fb_etc_dir is None:
-				raise click.UsageError('Invalid plugin directory: %s ' % path)
-			fb_plugin = FindBugsPlugin.parse(fb_etc_dir)
-			fb_plugins.append(fb_plugin)
-		sq_rules = None
-		if s is not None:
-			sq_rules_dir = SonarQube.Rules.find_dir(s)
-			sq_rules_file = SonarQube.Rules.get_file(sq_rules_dir, fb_plugin.head.short_id)
-			sq_rules = SonarQube.Rules.parse(sq_rules_file)
-		patterns = fb_plugins[-1].patterns
-		rankers = [p.ranker for p in fb_plugins]
-		output(patterns, rankers, sq_rules)
+		_run(stats, profile, 'rules.list', list_rules, fb_plugin_dir, s, stream, _cache(cache_dir, cache_size), _catalog(db))
 	
 	@main.command(context_settings=CONTEXT_SETTINGS, short_help='extract rules to fb2sq data file')
-	@click.argument('fb_plugin_dir', metavar='<fb_plugin_dir>', type=_type_dir)
-	@click.argument('sq_plugin_dir', metavar='<sq_plugin_dir>', type=_type_dir)
+	@click.argument('fb_plugin_dir', metavar='<fb_plugin_dir>', type=_type_ropath)
+	@click.argument('sq_plugin_dir', metavar='<sq_plugin_dir>', type=_type_ropath)
+	@click.option('--stream', is_flag=True, help='parse XML files incrementally')
+	@click.option('--cache-dir', metavar='<dir>', type=_type_wdir, required=False, help='cache parsed rules in directory')
+	@click.option('--cache-size', metavar='<mb>', type=int, default=64, help='maximum cache size in megabytes')
+	@click.option('--db', metavar='<db_file>', type=_type_rofile, required=False, help='read imported plugins and rules from a rule catalog')
+	@click.option('--stats', is_flag=True, help='print a JSON report of phase timings and counters to stderr')
+	@click.option('--profile', metavar='<file>', type=_type_rwfile, required=False, help='write a cProfile dump')
 	@click.pass_context
-	def extract(ctx, fb_plugin_dir, sq_plugin_dir):
+	def extract(ctx, fb_plugin_dir, sq_plugin_dir, stream, cache_dir, cache_size, db, stats, profile):
 		"""Extract FindBugs rules to fb2sq format.
 		
 		\b
 		<fb_plugin_dir>         FindBug plugin directory
 		<sq_plugin_dir>         SonarQube FindBugs plugin directory
 		 """
-		extract(fb_plugin_dir, sq_plugin_dir)
+		_run(stats, profile, 'rules.extract', extract, fb_plugin_dir, sq_plugin_dir, stream, _cache(cache_dir, cache_size), _catalog(db))
+	
+	@main.command(context_settings=CONTEXT_SETTINGS, short_help='list pattern changes between two plugin versions')
+	@click.argument('old_plugin_dir', metavar='<old_plugin_dir>', type=_type_ropath)
+	@click.argument('new_plugin_dir', metavar='<new_plugin_dir>', type=_type_ropath)
+	@click.option('--exit-code', is_flag=True, help='exit with 1 if there are changes')
+	@click.option('--stream', is_flag=True, help='parse XML files incrementally')
+	@click.option('--cache-dir', metavar='<dir>', type=_type_wdir, required=False, help='cache parsed rules in directory')
+	@click.option('--cache-size', metavar='<mb>', type=int, default=64, help='maximum cache size in megabytes')
+	@click.option('--db', metavar='<db_file>', type=_type_rofile, required=False, help='read imported plugins from a rule catalog')
+	@click.option('--stats', is_flag=True, help='print a JSON report of phase timings and counters to stderr')
+	@click.option('--profile', metavar='<file>', type=_type_rwfile, required=False, help='write a cProfile dump')
+	@click.pass_context
+	def diff(ctx, old_plugin_dir, new_plugin_dir, exit_code, stream, cache_dir, cache_size, db, stats, profile):
+		"""List added, removed and changed FindBugs patterns.
+		
+		Patterns are compared by content hashes of category, experimental
+		and deprecated flags, cweid, short description, details and rank.
+		
+		\b
+		<old_plugin_dir>        old FindBugs plugin directory
+		<new_plugin_dir>        new FindBugs plugin directory
+		 """
+		changes = _run(stats, profile, 'rules.diff', diff, old_plugin_dir, new_plugin_dir, stream, _cache(cache_dir, cache_size), _catalog(db))
+		if exit_code and changes > 0:
+			sys.exit(1)
+	
+	@main.command(context_settings=CONTEXT_SETTINGS, short_help='copy converted rules into a SonarQube FindBugs plugin')
+	@click.argument('sq_plugin_dir', metavar='<sq_plugin_dir>', type=_type_dir)
+	@click.option('-b', '--build-dir', metavar='<dir>', type=_type_wdir, required=False, help='fb2sq output directory [default: build]')
+	@click.option('-j', '--jobs', metavar='<n>', type=click.IntRange(1), default=8, help='copy files in n threads')
+	@click.option('--delete', is_flag=True, help='remove HTML files which are not in the output directory')
+	@click.pass_context
+	def deploy(ctx, sq_plugin_dir, build_dir, jobs, delete):
+		"""Copy changed fb2sq output files into a SonarQube FindBugs plugin.
+		
+		Files are compared by content hash and replaced atomically.
+		
+		\b
+		<sq_plugin_dir>         SonarQube FindBugs plugin directory
+		 """
+		deploy(sq_plugin_dir, build_dir, jobs, delete)
+	
+	@main.command(context_settings=CONTEXT_SETTINGS, short_help='find rule keys defined by more than one plugin')
+	@click.argument('paths', metavar='<rules_path> ...', type=_type_ropath, nargs=-1)
+	@click.option('-f', 'fb_plugin_dirs', metavar='<fb_plugin_dir>', type=_type_ropath, multiple=True, help='FindBugs plugin directory [multiple]')
+	@click.option('--exit-code', is_flag=True, help='exit with 1 if there are duplicates')
+	@click.pass_context
+	def duplicates(ctx, paths, fb_plugin_dirs, exit_code):
+		"""List rule keys which are defined by more than one plugin or
+		more than once in a file, with every location.
+		
+		\b
+		<rules_path>            rules file, output or SonarQube FindBugs plugin directory [multiple, default: build]
+		 """
+		if not (paths or fb_plugin_dirs):
+			paths = [_build_dir()]
+		if duplicates(paths, fb_plugin_dirs) > 0 and exit_code:
+			sys.exit(1)
+	
+	@main.command('import', context_settings=CONTEXT_SETTINGS, short_help='import plugins, rules and data files into a rule catalog')
+	@click.argument('db_file', metavar='<db_file>', type=_type_rwfile)
+	@click.option('-f', 'fb_plugin_dirs', metavar='<fb_plugin_dir>', type=_type_ropath, multiple=True, help='FindBugs plugin directory [multiple]')
+	@click.option('-s', 'sq_plugin_dirs', metavar='<sq_plugin_dir>', type=_type_ropath, multiple=True, help='SonarQube FindBugs plugin directory [multiple]')
+	@click.option('-d', 'data_files', metavar='<data_file>', type=_type_rofile, multiple=True, help='fb2sq data file [multiple]')
+	@click.option('--stream', is_flag=True, help='parse XML files incrementally')
+	@click.pass_context
+	def import_(ctx, db_file, fb_plugin_dirs, sq_plugin_dirs, data_files, stream):
+		"""Import FindBugs plugins, SonarQube rules and fb2sq data files into a SQLite rule catalog.
+		
+		\b
+		<db_file>               rule catalog database
+		 """
+		if not (fb_plugin_dirs or sq_plugin_dirs or data_files):
+			_err(ctx.get_help())
+		catalog = _catalog(db_file)
+		try:
+			import_catalog(catalog, fb_plugin_dirs, sq_plugin_dirs, data_files, stream)
+		finally:
+			catalog.close()
 
 if __name__ == '__main__':
 	cmd = CmdLine()
@@ -1,14 +1,31 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import sys, os, errno, re
-import argparse
-from cStringIO import StringIO
-from lxml import etree
+from __future__ import print_function
+import sys, os, errno
+import argparse, threading, hashlib, json, filecmp, time
+try:
+	from cStringIO import StringIO
+except ImportError:
+	from io import StringIO
 
-from fb import FindBugsPlugin
+from fb import FindBugsPlugin, FbUtils
+from textutils import TextUtils
+from stats import Stats
+from archive import Archive
 
 output_dir = 'build'
 
+if sys.version_info[0] < 3:
+	# the three argument raise does not even parse on Python 3
+	exec('def reraise(exc_type, exc_value, exc_tb):\n\traise exc_type, exc_value, exc_tb\n')
+else:
+	def reraise(exc_type, exc_value, exc_tb):
+		raise exc_value.with_traceback(exc_tb)
+tidy_fragment = None
+
+# descriptions rendered per job at a time, bounds memory for large plugins
+description_chunk = 256
+
 category_names = {"BAD_PRACTICE":"Bad practice",
                   "CORRECTNESS":"Correctness",
                   "MT_CORRECTNESS": "Multithreaded correctness",
@@ -20,14 +37,6 @@ category_names = {"BAD_PRACTICE":"Bad practice",
                   "STYLE": "Style"}
 valid_priorities = {"BLOCKER":1, "CRITICAL":1, "MAJOR":1, "MINOR":1, "INFO":1}
 
-rule_priorities = {}
-rule_tags = {}
-
-deprecated_rules = {}
-disabled_rules = {}
-experimental_rules = {}
-rule_order = {}
-
 
 def parse_args():
 	parser = argparse.ArgumentParser(
@@ -36,19 +45,48 @@ def parse_args():
 		formatter_class=lambda prog: argparse.HelpFormatter(prog, max_help_position=30)
 	)
 	parser.add_argument('data_file', metavar='data-file', help='rules data file')
-	parser.add_argument('fbrules_dir', metavar='fbrules-dir', help='directory which contains findbugs.xml and messages.xml')
+	parser.add_argument('fbrules_dir', metavar='fbrules-dir', help='directory or plugin JAR which contains findbugs.xml and messages.xml')
 	parser.add_argument('--html', help='export HTML files and relevant properties file', action='store_true')
 	parser.add_argument('--tidy', help='tidy HTML files', action='store_true')
-	parser.add_argument('-e', '--exclude', metavar='KEY', help='rule key to completely exclude', action='append')
-	parser.add_argument('-c', '--comment', metavar='KEY', help='rule key to comment out', action='append')
-	return parser.parse_args()
+	parser.add_argument('--stream', help='parse plugin XML files incrementally', action='store_true')
+	parser.add_argument('--cache-dir', metavar='DIR', help='cache parsed plugins and tidied HTML in directory')
+	parser.add_argument('--cache-size', metavar='MB', help='maximum cache size in megabytes', type=int, default=64)
+	parser.add_argument('-e', '--exclude', metavar='KEY', help='rule key to completely exclude, PREFIX:KEY for one plugin only', action='append')
+	parser.add_argument('-c', '--comment', metavar='KEY', help='rule key to comment out, PREFIX:KEY for one plugin only', action='append')
+	parser.add_argument('-i', '--incremental', help='only rewrite outputs whose inputs changed', action='store_true')
+	parser.add_argument('-p', '--plugin', metavar=('DATA-FILE', 'FBRULES-DIR'), help='additional plugin to convert concurrently', nargs=2, action='append')
+	parser.add_argument('-j', '--jobs', metavar='N', help='render descriptions in N processes', type=int, default=1)
+	parser.add_argument('--db', metavar='FILE', help='read plugins and data files from a rule catalog')
+	parser.add_argument('--stats', help='print a JSON report of phase timings and counters to stderr', action='store_true')
+	parser.add_argument('--profile', metavar='FILE', help='write a cProfile dump of the conversion')
+	parser.add_argument('-w', '--watch', help='keep running and reconvert when input files change', action='store_true')
+	parser.add_argument('--interval', metavar='SECONDS', help='polling interval for --watch', type=float, default=0.5)
+	parser.add_argument('-a', '--archive', metavar='FILE', help='write all outputs into a zip or jar laid out like the plugin resources')
+	args = parser.parse_args()
+	if args.jobs < 1:
+		parser.error('argument -j/--jobs: must be at least 1')
+	if args.interval <= 0:
+		parser.error('argument --interval: must be greater than 0')
+	if args.watch and args.db:
+		parser.error('argument -w/--watch: not allowed with argument --db')
+	if args.archive and (args.watch or args.incremental):
+		parser.error('argument -a/--archive: not allowed with argument -w/--watch or -i/--incremental')
+	return args
+
+def getroot():
+	cdir = os.path.dirname(os.path.realpath(__file__))
+	if os.path.isfile(cdir):
+		# bundled: resolve against the checkout, not the build directory holding the bundle
+		cdir = os.path.dirname(cdir)
+		if os.path.basename(cdir) == 'build':
+			cdir = os.path.dirname(cdir)
+	return cdir
 
 def getpath(path_file):
 	if (path_file[0] == "/"):
 		return path_file
 	else:
-		cdir = os.path.dirname(os.path.realpath(__file__))
-		return os.path.join(cdir, path_file)
+		return os.path.join(getroot(), path_file)
 
 def getint(s):
 	try:
@@ -56,89 +94,68 @@ def getint(s):
 	except ValueError:
 		return 0
 
-def init(args):
-	sq_rule_file = args.data_file
-	path = args.fbrules_dir
-	fb_plugin = FindBugsPlugin.parse(path)
-	
-	if not create_output_dir():
-		sys.exit('error: could not create directory for output')
-	
-	prefix = fb_plugin.head.short_id
-	if prefix == 'core':
-		prefix = 'findbugs'
-	
-	if args.html:
-		if not create_html_dir(prefix):
-			sys.exit('error: could not create directory for html files')
-	
-	if os.path.exists(sq_rule_file):
-		for line in open(sq_rule_file):
-			if line.startswith('#'): continue
-			props = line.split(':')
-			
-			if (len(props) < 5): continue
-			rule_key = props[0].strip()
-			if len(rule_key) == 0: continue
-			
-			sq_rule_nr = getint(props[1])
-			sq_prop_nr = getint(props[2])
-			sq_prof_nr = getint(props[3])
-			rule_order[rule_key] = [sq_rule_nr, sq_prop_nr, sq_prof_nr]
-			
-			priority = props[4].strip()
-			if (len(priority) > 0):
-				rule_priorities[rule_key] = priority
-			if (len(props) < 6): continue
-			states = props[5].strip()
-			for state in states.split(','):
-				if not state.strip(): continue
-				if state == 'DEPRECATED':
-					reason = props[6].strip() if len(props) > 6 else ''
-					if len(reason) > 0:
-						reason = reason.replace(',NotInSonarProfile', '').replace('NotInSonarProfile', '')
-					deprecated_rules[rule_key] = reason
-				elif state == 'DISABLED':
-					disabled_rules[rule_key] = True
-				elif state == 'EXPERIMENTAL':
-					experimental_rules[rule_key] = True
-					disabled_rules[rule_key] = True
-				else:
-					sys.exit('error: "%s" is invalid rule state.' % state)
-			if (len(props) < 8): continue
-			tags = props[7].strip()
-			if len(tags) > 0:
-				rule_tags[rule_key] = tags
-	
-	return [fb_plugin, prefix]
-
-def create_output_dir():
-	try:
-		os.makedirs(output_dir)
-	except OSError as exception:
-		if exception.errno != errno.EEXIST:
-			return False
-	return True
-
-def create_html_dir(prefix):
-	try:
-		os.makedirs(os.path.join(output_dir, 'html', prefix))
-	except OSError as exception:
-		if exception.errno != errno.EEXIST:
-			return False
-	return True
-
 def write_file_data(filename, contents, append = False):
 	fh = None
 	try:
 		fh = open(filename, 'a' if append else 'w')
 		if contents: fh.write(contents)
+		Stats.count('files.written')
+		Stats.count('bytes.written', len(contents or ''))
 	except IOError:
 		return False
 	finally:
 		if fh: fh.close()
 	return True
 
+def write_output(filename, contents, incremental):
+	if incremental and os.path.isfile(filename):
+		with open(filename, 'rb') as fh:
+			if fh.read() == contents:
+				return True
+	return write_file_data(filename, contents)
+
+def open_output(filename, incremental):
+	return open(filename + '.tmp' if incremental else filename, 'w')
+
+def close_output(fh, filename, incremental):
+	Stats.count('files.written')
+	Stats.count('bytes.written', fh.tell())
+	fh.close()
+	if not incremental:
+		return
+	tmp_filename = filename + '.tmp'
+	if os.path.isfile(filename) and filecmp.cmp(tmp_filename, filename, shallow=False):
+		os.remove(tmp_filename)
+	else:
+		os.rename(tmp_filename, filename)
+
+def get_cdata(text):
+	return '<![CDATA[%s]]>' % text.replace(']]>', ']]]]><![CDATA[>')
+
+def get_module_data(file_name, loader):
+	if loader is not None and hasattr(loader, 'get_data'):
+		return loader.get_data(file_name)
+	source_file = file_name[:-1] if file_name.endswith(('.pyc', '.pyo')) else file_name
+	with open(source_file if os.path.isfile(source_file) else file_name, 'rb') as fh:
+		return fh.read()
+
+def get_tool_hash(use_tidy = False):
+	"""Identifies the code which renders HTML descriptions.
+	
+	Covers fb2sq and textutils, read through their loaders so that it also
+	works inside the bundle, and the libtidy release when tidying.
+	"""
+	import textutils
+	h = hashlib.sha1()
+	for file_name, loader in [(__file__, globals().get('__loader__')), (textutils.__file__, getattr(textutils, '__loader__', None))]:
+		h.update(get_module_data(file_name, loader))
+	if use_tidy:
+		h.update(get_tidy_id())
+	return h.hexdigest()
+
+def get_input_hash(*values):
+	return hashlib.sha1(repr(values)).hexdigest()
+
 def get_prefix(root, defined_prefix):
 	prefix = defined_prefix
 	if not prefix:
@@ -166,6 +183,9 @@ category_fallback = {
 	"EXPERIMENTAL": "Experimental"
 }
 
+def get_rules_filename(prefix):
+	return 'rules.xml' if prefix == 'findbugs' else 'rules-%s.xml' % prefix
+
 def get_category_name(fb_plugin, fb_pattern):
 	category = fb_pattern.category_name.strip().upper()
 	if len(category) == 0:
@@ -180,188 +200,806 @@ def get_category_name(fb_plugin, fb_pattern):
 		category = category[0] + category[1:].lower().replace('_', ' ')
 	return category
 
-def get_priority(rule_key):
-	if rule_key in rule_priorities:
-		priority = rule_priorities[rule_key]
-		if priority == '?':
-			priority = 'INFO'
-		if not priority in valid_priorities:
-			sys.exit('error: "%s" is invalid rule priority.' % priority)
-		return priority
-	else:
-		return "INFO"
+def load_tidy():
+	global tidy_fragment
+	if tidy_fragment is None:
+		from tidylib import tidy_fragment as fragment
+		tidy_fragment = fragment
+	return tidy_fragment
 
-def get_order(rule_key):
-	if rule_key in rule_order:
-		return rule_order[rule_key]
-	else:
-		return [0, 0, 0]
-
-def get_deprecation_text(rule_key):
-	text = ''
-	if rule_key in deprecated_rules:
-		reason = deprecated_rules[rule_key]
-		if reason == 'ByFindBugsPlugin':
-			text = ''
-		else:
-			text = '},{rule:squid:'.join(filter(None, reason.split(',')))
-			text = '{rule:squid:' + text + '}'
-			text = text.replace('{rule:squid:}', '').strip()
-			comma = text.rfind(',')
-			if comma > -1:
-				text = text[:comma] + ' and ' + text[comma+1:]
-			if len(text) > 0:
-				text = '\n\n<p>\nThis rule is deprecated, use %s instead.\n</p>\n' % text
-	return text
+def get_tidy_id():
+	"""Identifies the libtidy release and options used by tidy_fragment."""
+	version = None
+	options = None
+	try:
+		import ctypes
+		from tidylib import tidy
+		options = getattr(tidy, 'BASE_OPTIONS', None)
+		lib = tidy.get_module_tidy() if hasattr(tidy, 'get_module_tidy') else tidy._tidy
+		lib = getattr(lib, '_tidy', lib)
+		for name in ('tidyLibraryVersion', 'tidyReleaseDate'):
+			func = getattr(lib, name, None)
+			if func is not None:
+				func.restype = ctypes.c_char_p
+				version = func()
+				break
+	except (ImportError, AttributeError, OSError):
+		pass
+	return repr((version, sorted((options or {}).items())))
 
 def fix_html_descr(html, use_tidy):
 	if use_tidy:
-		from tidylib import tidy_fragment
-		fragment, errors = tidy_fragment(html)
+		fragment, errors = load_tidy()(html)
 		#print "YEAH!" 
 		return fragment
-	print "--------------"
+	print("--------------")
 	#html = re.sub(r'    ','\t', html) # tabify
-	html = re.sub(r'^[ ]+<p>', '<p>', html)
-	lines = html.split('\n')
-	tabs = -1
-	for line in lines:
-		m = re.search('[^\t]', line)
-		if m and (tabs == -1 or m.start() < tabs):
-			tabs = m.start()
-	if tabs > 0:
-		 html = re.sub(r'\t' * tabs, '', html)
+	html = TextUtils.dedent(html)
 	#html = re.sub(r'<p>([^\n]*)\n[\t ]*</p>', '<p>###\\1</p>', html)
 	return html
 
-def get_description(rule_key, details, use_tidy):
+def get_description_xml(rule_key, details):
 	descr_xml = details.lstrip('\r\n').rstrip('\r\n')
-	descr_xml = re.sub(r'[\t ]+\n', '\n', descr_xml)
+	descr_xml = TextUtils.strip_trailing(descr_xml)
 	descr_xml = descr_xml.lstrip('\r\n').rstrip()
 	#use_tidy = False
 	if len(descr_xml.strip()) == 0:
 		descr_xml = rule_key
-	descr_html = fix_html_descr(descr_xml, use_tidy)
-	if rule_key in deprecated_rules:
-		reason = get_deprecation_text(rule_key)
-		descr_xml = descr_xml + reason
-		descr_html = descr_html + reason
-	
-	return [descr_xml, descr_html]
-
-def get_writer(ordered, nr):
-	if not nr in ordered:
-		ordered[nr] = StringIO()
-		if ordered['_max'] < nr:
-			ordered['_max'] = nr
-	return ordered[nr]
-
-def gen_output(output, ordered):
-	for i in range(1, ordered['_max'] + 1):
-		if i in ordered:
-			output.write(ordered[i].getvalue())
-	output.write(ordered[0].getvalue())
-
-def parse_keys(value):
+	return descr_xml
+
+def render_description(task):
+	descr_xml, use_tidy = task
+	return fix_html_descr(descr_xml, use_tidy)
+
+def render_description_timed(task):
+	started = time.time()
+	descr_html = render_description(task)
+	return descr_html, time.time() - started
+
+class OrderedOutput():
+	"""Collects output records and emits them sorted by their order number.
+	
+	Records keep insertion order within the same order number and unordered
+	records (order 0) go last; negative orders are never emitted. Only
+	(order, seq, key) is kept per record, the writer rebuilds the rest.
+	"""
+	def __init__(self):
+		self._items = []
+	
+	def add(self, order, key):
+		self._items.append((order, len(self._items), key))
+	
+	def __iter__(self):
+		for order, seq, key in sorted(self._items, key=lambda i: (i[0] == 0, i[0], i[1])):
+			if order < 0: continue
+			yield key
+	
+	def __len__(self):
+		return len(self._items)
+
+def parse_keys(value, prefix = None):
 	parsed_keys = {}
 	if value is not None:
 		for rawkey in value:
 			keys = rawkey.split(',')
 			for key in keys:
+				# rule keys never contain ':', 'fbcontrib:KEY' only applies to that plugin
+				scope, sep, key = key.rpartition(':')
+				if sep and scope != prefix: continue
 				parsed_keys[key] = True
 	return parsed_keys
 
-def parse_rules(args, fb_plugin, prefix):
+class Converter():
+	def __init__(self, args, output_dir = None, archive = None):
+		self.args = args
+		self.output_dir = getpath(output_dir or 'build')
+		self.archive = archive
+		self.tidy_cache = None
+		self.tidy_id = None
+		self.reset_data()
 	
-	exclude_keys = parse_keys(args.exclude)
-	comment_keys = parse_keys(args.comment)
+	def reset_data(self):
+		self.rule_priorities = {}
+		self.rule_tags = {}
+		self.deprecated_rules = {}
+		self.disabled_rules = {}
+		self.experimental_rules = {}
+		self.rule_order = {}
+		self.rule_rows = {}
 	
-	findbugs_core = (prefix == 'findbugs')
-	# if findbugs_core: category_names['STYLE'] = 'Dodgy'
+	@Stats.timed('fb2sq.init')
+	def init(self, sq_rule_file, path):
+		args = self.args
+		catalog = None
+		if args.db:
+			from catalog import RuleCatalog
+			catalog = RuleCatalog(args.db)
+		fb_plugin = self.load_plugin(path, catalog)
+		if args.tidy:
+			load_tidy()
+			if args.cache_dir:
+				from cache import ParseCache
+				self.tidy_cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+				self.tidy_id = get_tidy_id()
+		
+		if self.archive is None and not self.create_output_dir():
+			sys.exit('error: could not create directory for output')
+		
+		prefix = fb_plugin.head.short_id
+		if prefix == 'core':
+			prefix = 'findbugs'
+		
+		if args.html and self.archive is None:
+			if not self.create_html_dir(prefix):
+				sys.exit('error: could not create directory for html files')
+		
+		self.load_data(sq_rule_file, catalog)
+		if catalog is not None:
+			catalog.close()
+		return [fb_plugin, prefix]
 	
-	filename = 'findbugs.properties' if findbugs_core else 'findbugs-%s.properties' % prefix 
-	properties_file = os.path.join(output_dir, filename)
-	profile_file = os.path.join(output_dir, 'profile-%s.xml' % prefix)
+	def load_plugin(self, path, catalog = None):
+		args = self.args
+		fb_plugin = None
+		if catalog is not None:
+			fb_plugin = catalog.load_plugin(path)
+		if fb_plugin is None:
+			cache = None
+			if args.cache_dir:
+				from cache import ParseCache
+				cache = ParseCache(args.cache_dir, args.cache_size * 1024 * 1024)
+			fb_plugin = FindBugsPlugin.parse(path, args.stream, cache)
+		return fb_plugin
 	
-	orules = {0:StringIO(), '_max':0}
-	oprops = {0:StringIO(), '_max':0}
-	oprofs = {0:StringIO(), '_max':0}
+	def load_data(self, sq_rule_file, catalog = None):
+		self.reset_data()
+		rows = None
+		if catalog is not None:
+			rows = catalog.load_data_file(sq_rule_file)
+		if rows is None and os.path.exists(sq_rule_file):
+			rows = open(sq_rule_file)
+		if rows is not None:
+			for line in rows:
+				if line.startswith('#'): continue
+				props = line.split(':')
+				
+				if (len(props) < 5): continue
+				rule_key = props[0].strip()
+				if len(rule_key) == 0: continue
+				
+				sq_rule_nr = getint(props[1])
+				sq_prop_nr = getint(props[2])
+				sq_prof_nr = getint(props[3])
+				self.rule_order[rule_key] = [sq_rule_nr, sq_prop_nr, sq_prof_nr]
+				self.rule_rows[rule_key] = line.rstrip('\r\n')
+				
+				priority = props[4].strip()
+				if (len(priority) > 0):
+					self.rule_priorities[rule_key] = priority
+				if (len(props) < 6): continue
+				states = props[5].strip()
+				for state in states.split(','):
+					if not state.strip(): continue
+					if state == 'DEPRECATED':
+						reason = props[6].strip() if len(props) > 6 else ''
+						if len(reason) > 0:
+							reason = reason.replace(',NotInSonarProfile', '').replace('NotInSonarProfile', '')
+						self.deprecated_rules[rule_key] = reason
+					elif state == 'DISABLED':
+						self.disabled_rules[rule_key] = True
+					elif state == 'EXPERIMENTAL':
+						self.experimental_rules[rule_key] = True
+						self.disabled_rules[rule_key] = True
+					else:
+						sys.exit('error: "%s" is invalid rule state.' % state)
+				if (len(props) < 8): continue
+				tags = props[7].strip()
+				if len(tags) > 0:
+					self.rule_tags[rule_key] = tags
 	
-	for fb_pattern in sorted(fb_plugin.patterns.values(), key=lambda i:i.message_index):
-		fb_key = fb_pattern.name
-		if fb_key in exclude_keys: continue
-		fb_details =  fb_pattern.details
-		fb_shortdescr =  fb_pattern.short_desc
-		
-		sq_key = fb_key
-		[sq_rule_nr, sq_prop_nr, sq_prof_nr] = get_order(sq_key)
-		rule = get_writer(orules, sq_rule_nr)
-		prop = get_writer(oprops, sq_prop_nr)
-		prof = get_writer(oprofs, sq_prof_nr)
+	def create_output_dir(self):
+		try:
+			os.makedirs(self.output_dir)
+		except OSError as exception:
+			if exception.errno != errno.EEXIST:
+				return False
+		return True
+	
+	def create_html_dir(self, prefix):
+		try:
+			os.makedirs(os.path.join(self.output_dir, 'html', prefix))
+		except OSError as exception:
+			if exception.errno != errno.EEXIST:
+				return False
+		return True
+	
+	def open_output(self, name):
+		if self.archive is not None:
+			return StringIO()
+		return open_output(os.path.join(self.output_dir, name), self.args.incremental)
+	
+	def close_output(self, fh, name):
+		if self.archive is not None:
+			self.archive.add(name, fh.getvalue())
+			fh.close()
+		else:
+			close_output(fh, os.path.join(self.output_dir, name), self.args.incremental)
+	
+	def get_manifest_file(self, prefix):
+		return os.path.join(self.output_dir, '.fb2sq-%s.manifest' % prefix)
+	
+	def load_manifest(self, prefix):
+		try:
+			with open(self.get_manifest_file(prefix), 'r') as fh:
+				return json.load(fh)
+		except (IOError, ValueError):
+			return {}
+	
+	def save_manifest(self, prefix, manifest):
+		return write_output(self.get_manifest_file(prefix), json.dumps(manifest, indent=1, sort_keys=True), True)
+	
+	def get_priority(self, rule_key):
+		if rule_key in self.rule_priorities:
+			priority = self.rule_priorities[rule_key]
+			if priority == '?':
+				priority = 'INFO'
+			if not priority in valid_priorities:
+				sys.exit('error: "%s" is invalid rule priority.' % priority)
+			return priority
+		else:
+			return "INFO"
+	
+	def get_order(self, rule_key):
+		if rule_key in self.rule_order:
+			return self.rule_order[rule_key]
+		else:
+			return [0, 0, 0]
+	
+	def get_deprecation_text(self, rule_key):
+		text = ''
+		if rule_key in self.deprecated_rules:
+			reason = self.deprecated_rules[rule_key]
+			if reason == 'ByFindBugsPlugin':
+				text = ''
+			else:
+				text = '},{rule:squid:'.join(filter(None, reason.split(',')))
+				text = '{rule:squid:' + text + '}'
+				text = text.replace('{rule:squid:}', '').strip()
+				comma = text.rfind(',')
+				if comma > -1:
+					text = text[:comma] + ' and ' + text[comma+1:]
+				if len(text) > 0:
+					text = '\n\n<p>\nThis rule is deprecated, use %s instead.\n</p>\n' % text
+		return text
+	
+	def get_description(self, rule_key, descr_xml, descr_html):
+		if rule_key in self.deprecated_rules:
+			reason = self.get_deprecation_text(rule_key)
+			descr_xml = descr_xml + reason
+			if descr_html is not None:
+				descr_html = descr_html + reason
 		
-		sq_priority = get_priority(sq_key)
-		sq_cat = get_category_name(fb_plugin, fb_pattern)
+		return [descr_xml, descr_html]
+	
+	def get_tidy_key(self, descr_xml):
+		return self.tidy_cache.get_data_key('tidy', [self.tidy_id, descr_xml])
+	
+	def load_tidied(self, descr_xmls, is_rendered):
+		"""Maps indexes of descriptions found in the tidy cache to their fragments."""
+		tidied = {}
+		if self.tidy_cache is None:
+			return tidied
+		for i, (descr_xml, r) in enumerate(zip(descr_xmls, is_rendered)):
+			if not r: continue
+			descr_html = self.tidy_cache.load(self.get_tidy_key(descr_xml))
+			if descr_html is not None:
+				tidied[i] = descr_html
+		Stats.count('tidy.cache.hits', len(tidied))
+		Stats.count('tidy.cache.misses', sum(is_rendered) - len(tidied))
+		return tidied
+	
+	def iter_descriptions(self, fb_patterns, use_tidy, jobs, render_keys = None):
+		"""Yields (pattern, description XML, rendered HTML or None) in pattern order.
 		
-		sq_name = sq_cat + " - " + fb_shortdescr.strip()
+		Patterns are handled in chunks of description_chunk per job, so only one
+		chunk of descriptions is held in memory, however large the plugin is.
+		"""
+		timed = Stats.current is not None
+		render = render_description_timed if timed else render_description
+		pool = None
+		chunk_size = description_chunk * jobs
+		if jobs > 1 and len(fb_patterns) > 1:
+			import multiprocessing
+			pool = multiprocessing.Pool(jobs)
+		try:
+			for start in range(0, len(fb_patterns), chunk_size):
+				chunk = fb_patterns[start:start + chunk_size]
+				descr_xmls = [get_description_xml(p.name, p.details) for p in chunk]
+				is_rendered = [render_keys is None or p.name in render_keys for p in chunk]
+				tidied = self.load_tidied(descr_xmls, is_rendered) if use_tidy else {}
+				tasks = [(descr_xml, use_tidy) for i, (descr_xml, r) in enumerate(zip(descr_xmls, is_rendered)) if r and not i in tidied]
+				if pool is not None:
+					rendered = iter(pool.imap(render, tasks, max(1, len(tasks) // (jobs * 4))))
+				else:
+					rendered = (render(task) for task in tasks)
+				for i, (fb_pattern, descr_xml, r) in enumerate(zip(chunk, descr_xmls, is_rendered)):
+					descr_html = None
+					if i in tidied:
+						descr_html = tidied[i]
+					elif r:
+						descr_html = next(rendered)
+						if timed:
+							descr_html, elapsed = descr_html
+							Stats.sample('fb2sq.render', elapsed)
+							if use_tidy:
+								Stats.count('tidy.calls')
+						if use_tidy and self.tidy_cache is not None:
+							self.tidy_cache.store(self.get_tidy_key(descr_xml), descr_html)
+					descr_xml, descr_html = self.get_description(fb_pattern.name, descr_xml, descr_html)
+					yield fb_pattern, descr_xml, descr_html
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+	
+	def get_rule_name(self, fb_plugin, fb_pattern):
+		return get_category_name(fb_plugin, fb_pattern) + " - " + fb_pattern.short_desc.strip()
+	
+	def write_rule(self, fh, findbugs_core, fb_plugin, sq_key):
+		# rebuilt from the pattern rather than kept per rule, so memory does not grow with descriptions
+		fb_pattern = fb_plugin.patterns[sq_key]
+		sq_priority = self.get_priority(sq_key)
+		sq_name = self.get_rule_name(fb_plugin, fb_pattern)
 		sq_config_key = sq_key
-		[sq_descr_xml, sq_descr_html] = get_description(sq_key, fb_details, args.tidy)
+		if findbugs_core:
+			fh.write('  <rule key="%s">\n' % sq_key)
+			fh.write('    <priority>%s</priority>\n' % sq_priority)
+		else:
+			fh.write('  <rule key="%s" priority="%s">\n' % (sq_key, sq_priority))
+		fh.write('    <name>%s</name>\n' % get_cdata(sq_name))
+		fh.write('    <configKey>%s</configKey>\n' % get_cdata(sq_config_key))
+		if sq_key in self.rule_tags:
+			for rule_tag in self.rule_tags[sq_key].split(','):
+				fh.write('    <tag>%s</tag>\n' % rule_tag)
+		if sq_key in self.deprecated_rules:
+			fh.write('    <status>DEPRECATED</status>\n')
+		elif sq_key in self.experimental_rules:
+			fh.write('    <status>BETA</status>\n')
+		if not findbugs_core:
+			sq_descr_xml = self.get_description(sq_key, get_description_xml(sq_key, fb_pattern.details), None)[0]
+			fh.write('    <description>%s</description>\n' % get_cdata('\n\n%s\n\n\t\t' % sq_descr_xml))
+		fh.write('  </rule>\n\n')
+	
+	@Stats.timed('fb2sq.parse_rules')
+	def parse_rules(self, fb_plugin, prefix):
+		args = self.args
+		
+		exclude_keys = parse_keys(args.exclude, prefix)
+		comment_keys = parse_keys(args.comment, prefix)
+		
+		findbugs_core = (prefix == 'findbugs')
+		# if findbugs_core: category_names['STYLE'] = 'Dodgy'
 		
-		prop.write('rule.findbugs.%s.name=%s\n' % (sq_key, sq_name))
-		if args.html:
-			filename = os.path.join(output_dir, 'html', prefix, ('%s.html' % sq_key))
-			if not write_file_data(filename, sq_descr_html):
+		properties_name = 'findbugs.properties' if findbugs_core else 'findbugs-%s.properties' % prefix 
+		properties_file = os.path.join(self.output_dir, properties_name)
+		profile_name = 'profile-%s.xml' % prefix
+		profile_file = os.path.join(self.output_dir, profile_name)
+		
+		orules = OrderedOutput()
+		oprops = OrderedOutput()
+		oprofs = OrderedOutput()
+		
+		fb_patterns = []
+		for fb_pattern in sorted(fb_plugin.patterns.values(), key=lambda i:i.message_index):
+			if fb_pattern.name in exclude_keys: continue
+			fb_patterns.append(fb_pattern)
+		
+		manifest = {}
+		render_keys = None
+		if args.incremental:
+			old_manifest = self.load_manifest(prefix)
+			tool_hash = get_tool_hash(args.tidy)
+			render_keys = {}
+			if not args.html:
+				# no html is written this run, the files of an earlier --html run stay valid
+				manifest.update(old_manifest)
+			for fb_pattern in fb_patterns:
+				sq_key = fb_pattern.name
+				if not args.html: continue
+				html_name = 'html/%s/%s.html' % (prefix, sq_key)
+				html_hash = get_input_hash(tool_hash, args.tidy, sq_key, fb_pattern.details, self.rule_rows.get(sq_key))
+				manifest[html_name] = html_hash
+				filename = os.path.join(self.output_dir, 'html', prefix, ('%s.html' % sq_key))
+				if old_manifest.get(html_name) != html_hash or not os.path.isfile(filename):
+					render_keys[sq_key] = True
+			for html_name in old_manifest:
+				if html_name in manifest or not html_name.startswith('html/%s/' % prefix):
+					continue
+				filename = os.path.join(self.output_dir, *html_name.split('/'))
+				if os.path.isfile(filename):
+					os.remove(filename)
+		descriptions = self.iter_descriptions(fb_patterns, args.tidy, args.jobs, render_keys)
+		
+		for fb_pattern, sq_descr_xml, sq_descr_html in descriptions:
+			sq_key = fb_pattern.name
+			[sq_rule_nr, sq_prop_nr, sq_prof_nr] = self.get_order(sq_key)
+			# validates the priority before any output is written
+			self.get_priority(sq_key)
+			
+			oprops.add(sq_prop_nr, sq_key)
+			if args.html and sq_descr_html is not None and self.archive is not None:
+				self.archive.add('html/%s/%s.html' % (prefix, sq_key), sq_descr_html)
+			elif args.html and sq_descr_html is not None:
+				filename = os.path.join(self.output_dir, 'html', prefix, ('%s.html' % sq_key))
+				if not write_file_data(filename, sq_descr_html):
+					sys.exit('error: could not write "%s"' % filename) 
+			
+			if not sq_key in self.disabled_rules:
+				oprofs.add(sq_prof_nr, sq_key)
+			
+			orules.add(sq_rule_nr, sq_key)
+		
+		with Stats.phase('fb2sq.write'):
+			try:
+				fh = self.open_output(properties_name)
+				for sq_key in oprops:
+					fh.write('rule.findbugs.%s.name=%s\n' % (sq_key, self.get_rule_name(fb_plugin, fb_plugin.patterns[sq_key])))
+				self.close_output(fh, properties_name)
+			except (IOError, OSError):
+				sys.exit('error: could not write "%s"' % properties_file) 
+			
+			try:
+				fh = self.open_output(profile_name)
+				fh.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+				fh.write('<!-- Generated by fb2sq -->\n')
+				fh.write('<FindBugsFilter>\n')
+				for sq_key in oprofs:
+					fh.write('  <Match>\n')
+					fh.write('    <Bug pattern="%s"/>\n' % sq_key)
+					fh.write('  </Match>\n')
+				fh.write('</FindBugsFilter>\n')
+				self.close_output(fh, profile_name)
+			except (IOError, OSError):
+				sys.exit('error: could not write "%s"' % profile_file) 
+			
+			rules_name = get_rules_filename(prefix)
+			filename = os.path.join(self.output_dir, rules_name)
+			try:
+				fh = self.open_output(rules_name)
+				fh.write('<rules>\n')
+				fh.write('\n' if findbugs_core else '  <!-- %s -->\n' % prefix)
+				for sq_key in orules:
+					self.write_rule(fh, findbugs_core, fb_plugin, sq_key)
+				fh.write('</rules>')
+				self.close_output(fh, rules_name)
+			except (IOError, OSError):
 				sys.exit('error: could not write "%s"' % filename) 
 		
-		if not sq_key in disabled_rules:
-			prof.write('  <Match>\n')
-			prof.write('    <Bug pattern="%s"/>\n' % sq_key)
-			prof.write('  </Match>\n')
+		if self.archive is not None:
+			self.archive.close()
 		
-		if findbugs_core:
-			rule.write('  <rule key="%s">\n' % sq_key)
-			rule.write('    <priority>%s</priority>\n' % sq_priority)
-		else:
-			rule.write('  <rule key="%s" priority="%s">\n' % (sq_key, sq_priority))
-		rule.write('    <name><![CDATA[%s]]></name>\n' % sq_name)
-		rule.write('    <configKey><![CDATA[%s]]></configKey>\n' % sq_config_key)
-		if sq_key in rule_tags:
-			for rule_tag in rule_tags[sq_key].split(','):
-				rule.write('    <tag>%s</tag>\n' % rule_tag)
-		if sq_key in deprecated_rules:
-			rule.write('    <status>DEPRECATED</status>\n')
-		elif sq_key in experimental_rules:
-			rule.write('    <status>BETA</status>\n')
-		if not findbugs_core:
-			rule.write('    <description><![CDATA[\n\n%s\n\n\t\t]]></description>\n' % sq_descr_xml)
-		rule.write('  </rule>\n\n')
-	
-	props = StringIO();
-	gen_output(props, oprops)
-	if not write_file_data(properties_file, props.getvalue()):
-		sys.exit('error: could not write "%s"' % properties_file) 
-	
-	profs = StringIO();
-	profs.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-	profs.write('<!-- Generated by fb2sq -->\n')
-	profs.write('<FindBugsFilter>\n')
-	gen_output(profs, oprofs)
-	profs.write('</FindBugsFilter>\n')
-	if not write_file_data(profile_file, profs.getvalue()):
-		sys.exit('error: could not write "%s"' % profile_file) 
-	
-	rules = StringIO();
-	rules.write('<rules>\n')
-	rules.write('\n' if findbugs_core else '  <!-- %s -->\n' % prefix)
-	gen_output(rules, orules)
-	rules.write('</rules>')
-	filename = 'rules.xml' if findbugs_core else 'rules-%s.xml' % prefix 
-	filename = os.path.join(output_dir, filename)
-	if not write_file_data(filename, rules.getvalue()):
-		sys.exit('error: could not write "%s"' % filename) 
+		if args.incremental:
+			if not self.save_manifest(prefix, manifest):
+				sys.exit('error: could not write "%s"' % self.get_manifest_file(prefix))
+	
+	def convert(self, sq_rule_file, path):
+		self.parse_rules(*self.init(sq_rule_file, path))
+
+class ConverterThread(threading.Thread):
+	def __init__(self, func, *args):
+		threading.Thread.__init__(self)
+		self.func = func
+		self.args = args
+		self.result = None
+		self.error = None
+	
+	def run(self):
+		try:
+			self.result = self.func(*self.args)
+		except BaseException:
+			self.error = sys.exc_info()
+
+class OutputArchive():
+	"""Streams the converted files into one zip or jar.
+	
+	Entries are laid out like the resources of the SonarQube FindBugs plugin
+	and written with a fixed timestamp and mode. Each converter writes through
+	its own part; parts follow each other in the order they were created, each
+	in the order its entries were added, so the same inputs always give a
+	byte-identical archive however the converter threads interleave. Only the
+	first unfinished part writes straight into the archive, later ones spool to
+	an uncompressed temporary zip until their turn. An unchanged archive is not
+	replaced, which keeps its mtime for make and CI caches.
+	"""
+	RULES_DIR = 'org/sonar/plugins/findbugs'
+	L10N_DIR = 'org/sonar/l10n'
+	DATE_TIME = (1980, 1, 1, 0, 0, 0)
+	
+	class Part():
+		def __init__(self, archive, index):
+			self.archive = archive
+			self.index = index
+			self.spool = None
+			self.closed = False
+		
+		def add(self, name, contents):
+			if isinstance(contents, unicode):
+				contents = contents.encode('utf-8')
+			name = OutputArchive.get_entry_name(name)
+			with self.archive.lock:
+				if self.index == self.archive.active:
+					OutputArchive.write_entry(self.archive.zf, name, contents)
+					return
+				if self.spool is None:
+					import tempfile, zipfile
+					self.spool = zipfile.ZipFile(tempfile.TemporaryFile(), 'w', zipfile.ZIP_STORED)
+				self.spool.writestr(name, contents)
+		
+		def close(self):
+			with self.archive.lock:
+				self.closed = True
+				self.archive.advance()
+		
+		def flush(self, zf):
+			if self.spool is None:
+				return
+			import zipfile
+			fh = self.spool.fp
+			self.spool.close()
+			self.spool = None
+			try:
+				spool = zipfile.ZipFile(fh, 'r')
+				for info in spool.infolist():
+					OutputArchive.write_entry(zf, info.filename, spool.read(info))
+			finally:
+				fh.close()
+		
+		def discard(self):
+			if self.spool is not None:
+				self.spool.fp.close()
+				self.spool = None
+	
+	def __init__(self, filename):
+		self.filename = filename
+		self.parts = []
+		self.active = 0
+		self.fh = None
+		self.zf = None
+		self.tmp_filename = None
+		self.lock = threading.Lock()
+	
+	@staticmethod
+	def get_entry_name(name):
+		parts = name.split('/')
+		if parts[0] == 'html':
+			return '/'.join([OutputArchive.L10N_DIR, 'findbugs', 'rules'] + parts[1:])
+		if name.endswith('.properties'):
+			return '%s/%s' % (OutputArchive.L10N_DIR, name)
+		return '%s/%s' % (OutputArchive.RULES_DIR, name)
+	
+	@staticmethod
+	def write_entry(zf, name, contents):
+		import zipfile
+		info = zipfile.ZipInfo(name, OutputArchive.DATE_TIME)
+		info.create_system = 3
+		info.external_attr = 0o644 << 16
+		info.compress_type = zipfile.ZIP_DEFLATED
+		zf.writestr(info, contents)
+	
+	def part(self):
+		part = OutputArchive.Part(self, len(self.parts))
+		self.parts.append(part)
+		return part
+	
+	def open(self):
+		# imported here, like archive.py, so conversions without -a never pay for them
+		import tempfile, zipfile
+		output_dir = os.path.dirname(self.filename)
+		if output_dir and not os.path.isdir(output_dir):
+			os.makedirs(output_dir)
+		fd, self.tmp_filename = tempfile.mkstemp(prefix='.fb2sq-', suffix='.tmp', dir=output_dir or '.')
+		self.fh = os.fdopen(fd, 'wb')
+		self.zf = zipfile.ZipFile(self.fh, 'w', zipfile.ZIP_DEFLATED)
+	
+	def advance(self):
+		"""Hands the archive to the next unfinished part, copying in what it spooled. Needs the lock."""
+		while self.active < len(self.parts) and self.parts[self.active].closed:
+			self.active += 1
+			if self.active < len(self.parts):
+				self.parts[self.active].flush(self.zf)
+	
+	@Stats.timed('fb2sq.archive')
+	def close(self):
+		try:
+			with self.lock:
+				for part in self.parts:
+					part.closed = True
+				self.advance()
+				self.zf.close()
+				Stats.count('files.written')
+				Stats.count('bytes.written', self.fh.tell())
+				self.fh.close()
+			if os.path.isfile(self.filename) and filecmp.cmp(self.tmp_filename, self.filename, shallow=False):
+				os.remove(self.tmp_filename)
+			else:
+				os.chmod(self.tmp_filename, 0o644)
+				os.rename(self.tmp_filename, self.filename)
+		except BaseException:
+			self.abort()
+			raise
+	
+	def abort(self):
+		for part in self.parts:
+			part.discard()
+		if self.fh is not None:
+			self.fh.close()
+		if self.tmp_filename is not None and os.path.isfile(self.tmp_filename):
+			os.remove(self.tmp_filename)
+
+def check_duplicates(args, output_dir, plugins):
+	"""Exits if a rule key of the converted plugins is defined by another plugin.
+	
+	The keys of all plugins converted in this run are indexed together with
+	the rules files already in output_dir that this run does not replace.
+	Without an output_dir only the converted plugins are checked.
+	"""
+	import glob
+	from sq import SonarQube
+	index = SonarQube.RuleKeys()
+	rules_filenames = set()
+	for path, (fb_plugin, prefix) in plugins:
+		exclude_keys = parse_keys(args.exclude, prefix)
+		findbugs_xml = FbUtils.get_file('findbugs.xml', path)
+		for fb_pattern in fb_plugin.patterns.values():
+			if fb_pattern.name in exclude_keys: continue
+			index.add(fb_pattern.name, fb_plugin.head.short_id, findbugs_xml, fb_pattern.pattern_index)
+		rules_filenames.add(get_rules_filename(prefix))
+	for filename in sorted(glob.glob(os.path.join(output_dir, 'rules*.xml')) if output_dir else []):
+		if os.path.basename(filename) in rules_filenames: continue
+		index.add_rules(filename)
+	collisions = index.get_duplicates()
+	if len(collisions) > 0:
+		lines = ['error: duplicate rule keys:']
+		for key, locations in collisions:
+			for plugin_id, filename, position in locations:
+				lines.append('  %s: %s %s:%d' % (key, plugin_id, filename, position))
+		sys.exit('\n'.join(lines))
+
+class Watcher():
+	"""Keeps a converted plugin resident and reconverts it when its inputs change.
+	
+	Inputs are polled with os.stat, so no file system notification support is
+	needed. Only the changed inputs are reloaded and, as with --incremental,
+	only the outputs whose contents change are rewritten.
+	"""
+	def __init__(self, converter, sq_rule_file, path):
+		self.converter = converter
+		self.sq_rule_file = sq_rule_file
+		self.path = path
+		self.findbugs_xml = FbUtils.get_file('findbugs.xml', path)
+		self.messages_xml = FbUtils.get_file('messages.xml', path)
+		self.bugrank_file = FbUtils.get_file('bugrank.txt', path)
+		archive_file = path if Archive.is_archive(path) else Archive.split(path)[0]
+		if archive_file is not None:
+			# members can not be stat'ed, any change to the archive reloads the plugin
+			self.findbugs_xml = self.messages_xml = self.bugrank_file = archive_file
+		self.signatures = self.get_signatures()
+		self.fb_plugin, self.prefix = converter.init(sq_rule_file, path)
+		self.pending = True
+	
+	@staticmethod
+	def get_signature(filename):
+		try:
+			st = os.stat(filename)
+		except OSError:
+			return None
+		return (st.st_mtime, st.st_size, st.st_ino)
+	
+	def get_signatures(self):
+		filenames = [self.sq_rule_file, self.findbugs_xml, self.messages_xml, self.bugrank_file]
+		return dict((filename, Watcher.get_signature(filename)) for filename in filenames)
+	
+	def convert(self):
+		self.converter.parse_rules(self.fb_plugin, self.prefix)
+		self.pending = False
+	
+	def poll(self):
+		signatures = self.get_signatures()
+		changed = [f for f in sorted(signatures) if signatures[f] != self.signatures.get(f)]
+		if len(changed) == 0:
+			return changed
+		self.signatures = signatures
+		if self.findbugs_xml in changed or self.messages_xml in changed:
+			self.fb_plugin = self.converter.load_plugin(self.path)
+		elif self.bugrank_file in changed:
+			self.fb_plugin.load_ranker(self.path)
+		if self.sq_rule_file in changed:
+			self.converter.load_data(self.sq_rule_file)
+		self.pending = True
+		return changed
+
+def watch_all(args, pairs, output_dir = None):
+	watchers = [Watcher(Converter(args, output_dir), sq_rule_file, path) for sq_rule_file, path in pairs]
+	output_dir = watchers[0].converter.output_dir
+	check_duplicates(args, output_dir, [(w.path, (w.fb_plugin, w.prefix)) for w in watchers])
+	for watcher in watchers:
+		watcher.convert()
+	print('fb2sq: watching %d plugin(s), press Ctrl-C to stop' % len(watchers), file=sys.stderr)
+	try:
+		while True:
+			time.sleep(args.interval)
+			started = time.time()
+			try:
+				changed = [(watcher, watcher.poll()) for watcher in watchers]
+				if not any(watcher.pending for watcher in watchers):
+					continue
+				check_duplicates(args, output_dir, [(w.path, (w.fb_plugin, w.prefix)) for w in watchers])
+				for watcher, filenames in changed:
+					if not watcher.pending: continue
+					watcher.convert()
+					names = ', '.join(os.path.basename(f) for f in filenames)
+					print('fb2sq: %s reconverted in %d ms (%s)' % (watcher.prefix, (time.time() - started) * 1000, names), file=sys.stderr)
+			except SystemExit as e:
+				print(e.code, file=sys.stderr)
+			except Exception as e:
+				print('error: %s' % e, file=sys.stderr)
+	except KeyboardInterrupt:
+		pass
+
+def run_all(args, calls):
+	if args.profile:
+		# cProfile only sees the calling thread
+		return [func(*func_args) for func, func_args in calls]
+	threads = []
+	for func, func_args in calls:
+		thread = ConverterThread(func, *func_args)
+		thread.start()
+		threads.append(thread)
+	for thread in threads:
+		thread.join()
+	for thread in threads:
+		if thread.error is not None:
+			reraise(*thread.error)
+	return [thread.result for thread in threads]
+
+def convert_all(args, pairs, output_dir = None):
+	archive = OutputArchive(os.path.abspath(args.archive)) if args.archive else None
+	converters = [Converter(args, output_dir, archive.part() if archive else None) for _ in pairs]
+	plugins = run_all(args, [(c.init, pair) for c, pair in zip(converters, pairs)])
+	# an archive is rewritten as a whole, there are no other rules files to check against
+	check_duplicates(args, None if archive else converters[0].output_dir, [(path, plugin) for (sq_rule_file, path), plugin in zip(pairs, plugins)])
+	if archive is not None:
+		try:
+			archive.open()
+		except (IOError, OSError):
+			sys.exit('error: could not write "%s"' % archive.filename)
+	try:
+		run_all(args, [(c.parse_rules, plugin) for c, plugin in zip(converters, plugins)])
+	except BaseException:
+		if archive is not None:
+			archive.abort()
+		raise
+	if archive is not None:
+		try:
+			archive.close()
+		except (IOError, OSError):
+			sys.exit('error: could not write "%s"' % archive.filename)
 
 def main():
 	args = parse_args()
-	parse_rules(args, *init(args))
+	pairs = [(args.data_file, args.fbrules_dir)] + (args.plugin or [])
+	run = convert_all
+	if args.watch:
+		args.incremental = True
+		run = watch_all
+	if args.stats:
+		Stats.start()
+	if args.profile:
+		Stats.profile(run, args.profile, args, pairs, output_dir)
+	else:
+		run(args, pairs, output_dir)
+	if args.stats:
+		Stats.write(Stats.stop())
 	sys.exit(0)
 
 if __name__ == '__main__':
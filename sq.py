@@ -25,6 +25,20 @@
 """
 import os, re
 from lxml import etree
+from textutils import TextUtils
+from stats import Stats
+from archive import Archive
+try:
+	from os import scandir as _scandir
+except ImportError:
+	try:
+		from scandir import scandir as _scandir
+	except ImportError:
+		_scandir = None
+try:
+	_unichr = unichr
+except NameError:
+	_unichr = chr
 
 class SqXml():
 	@staticmethod
@@ -53,8 +67,38 @@ class SqXml():
 	def get_cnode_text(xnode, child_name, default_value=None, clean=False):
 		xnode = SqXml.get_node(xnode, child_name)
 		return SqXml.get_node_text(xnode, default_value, clean)
+	
+	@staticmethod
+	def iter_children(xml_file):
+		"""Stream (position, node) for each direct child of the root element.
+		
+		Position 0 is the root itself, reported as soon as it is opened.
+		Children are reported once complete, with 1-based positions matching
+		getparent().index() + 1, and are cleared after being consumed.
+		"""
+		depth = 0
+		position = 0
+		for event, xnode in etree.iterparse(xml_file, events=('start', 'end', 'comment', 'pi')):
+			if event == 'start':
+				depth += 1
+				if depth == 1:
+					yield 0, xnode
+			elif event == 'end':
+				depth -= 1
+				if depth == 1:
+					position += 1
+					yield position, xnode
+					xnode.clear()
+					while xnode.getprevious() is not None:
+						del xnode.getparent()[0]
+			elif depth == 1:
+				position += 1
 
 class SqUtils():
+	_RE_PROPERTY_KEY = re.compile(r'((?:\\.|[^=: \t\f\\])*)[ \t\f]*[=:]?[ \t\f]*')
+	_RE_PROPERTY_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|.)')
+	_PROPERTY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'f': '\f'}
+	
 	@staticmethod
 	def parse_int(s):
 		return int(SqUtils.parse_num(s))
@@ -75,12 +119,61 @@ class SqUtils():
 	
 	@staticmethod
 	def get_clean(text):
-		return re.sub(r'[\n\t\s]+', ' ', text).strip()
+		return TextUtils.get_clean(text)
 	
 	@staticmethod
 	def get_dir(p):
 		return os.path.realpath(os.path.expanduser(p))
 	
+	@staticmethod
+	def _unescape_property(mx):
+		c = mx.group(1)
+		if len(c) == 5:
+			return _unichr(int(c[1:], 16))
+		return SqUtils._PROPERTY_ESCAPES.get(c, c)
+	
+	@staticmethod
+	def iter_properties(fh):
+		"""Yields (key, value) pairs of a Java properties file in a single pass.
+		
+		Handles comments, line continuations and backslash escapes
+		(including \\uXXXX) like java.util.Properties.load. Byte lines are
+		decoded as ISO 8859-1 first, as load(InputStream) does, so keys and
+		values are always text.
+		"""
+		buf = None
+		for line in fh:
+			if isinstance(line, bytes):
+				line = line.decode('latin-1')
+			line = line.rstrip('\r\n').lstrip(' \t\f')
+			if buf is None and (len(line) == 0 or line[0] in '#!'):
+				continue
+			if line.endswith('\\') and (len(line) - len(line.rstrip('\\'))) % 2 == 1:
+				buf = (buf or '') + line[:-1]
+				continue
+			if buf is not None:
+				line = buf + line
+				buf = None
+			elif not '\\' in line:
+				i = line.find('=')
+				key = line[:i]
+				if i > 0 and not (':' in key or ' ' in key or '\t' in key or '\f' in key):
+					yield key, line[i+1:].lstrip(' \t\f')
+					continue
+			yield SqUtils._split_property(line)
+		if buf is not None:
+			yield SqUtils._split_property(buf)
+	
+	@staticmethod
+	def _split_property(line):
+		mx = SqUtils._RE_PROPERTY_KEY.match(line)
+		key, value = mx.group(1), line[mx.end():]
+		if '\\' in key:
+			key = SqUtils._RE_PROPERTY_ESCAPE.sub(SqUtils._unescape_property, key)
+		if '\\' in value:
+			value = SqUtils._RE_PROPERTY_ESCAPE.sub(SqUtils._unescape_property, value)
+		return key, value
+	
 	@staticmethod
 	def get_file(p, root = None):
 		p = os.path.expanduser(p)
@@ -93,6 +186,9 @@ class SqUtils():
 
 class SonarQube(object):
 	class Rules(dict):
+		HTML_THREADS = 8
+		PROPERTY_FIELDS = ('key', 'config_key', 'priority', 'status', 'cardinality', 'name', 'description')
+		
 		def __init__(self, *args, **kwargs):
 			dict.__init__(self, *args, **kwargs)
 		
@@ -105,19 +201,42 @@ class SonarQube(object):
 				file_name = 'rules-findsecbugs.xml'
 			return SqUtils.get_file(os.path.join(rules_dir, file_name))
 		
+		@staticmethod
+		def get_plugin_id(rules_xml):
+			name = os.path.splitext(os.path.basename(rules_xml))[0]
+			if name == 'rules':
+				return 'core'
+			if name.startswith('rules-'):
+				return name[len('rules-'):]
+			return name
+		
+		@staticmethod
+		def iter_keys(rules_xml):
+			"""Stream (position, key) for each rule in rules_xml, duplicates included."""
+			for position, xrule in SqXml.iter_children(Archive.get_source(rules_xml)):
+				if position == 0 or xrule.tag != 'rule':
+					continue
+				key = SqXml.get_attr_value(xrule, 'key')
+				if not key:
+					key = SqXml.get_cnode_text(xrule, 'key')
+				if key:
+					yield position, key
+		
 		@staticmethod
 		def find_dir(plugin_dir):
 			plugin_dir = SqUtils.get_dir(plugin_dir)
-			if not os.path.isdir(plugin_dir):
+			if Archive.is_archive(plugin_dir):
+				return Archive.find_dir(plugin_dir, ['rules.xml'], 'org/sonar/plugins/findbugs')
+			if not Archive.isdir(plugin_dir):
 				return None
 			rules_xml = SqUtils.get_file('rules.xml', plugin_dir)
-			if os.path.isfile(rules_xml):
+			if Archive.isfile(rules_xml):
 				return plugin_dir
 			pom_xml = SqUtils.get_file('pom.xml', plugin_dir)
-			if not os.path.isfile(pom_xml):
+			if not Archive.isfile(pom_xml):
 				return None
 			parser = etree.XMLParser(recover=True)
-			xtree = etree.parse(pom_xml, parser)
+			xtree = etree.parse(Archive.get_source(pom_xml), parser)
 			xroot = xtree.getroot()
 			if xroot is None:
 				return None
@@ -131,79 +250,167 @@ class SonarQube(object):
 			else:
 				return None
 		
+		@staticmethod
+		def _read_properties(prop_file):
+			"""Maps rule keys to (properties_index, {field: value}).
+			
+			properties_index is the position of the rule's first entry among
+			all rule.<plugin>.<key>.<field> entries; empty values are skipped.
+			Comment lines and continuation lines are not entries, so they do
+			not count.
+			"""
+			properties = {}
+			idx = 0
+			with Archive.open(prop_file, 'rb') as f:
+				for prop_key, prop_value in SqUtils.iter_properties(f):
+					parts = prop_key.split('.')
+					if len(parts) != 4:
+						continue
+					idx += 1
+					entry = properties.get(parts[2])
+					if entry is None:
+						entry = properties[parts[2]] = (idx, {})
+					prop_value = prop_value.strip()
+					if len(prop_value) > 0:
+						entry[1][parts[3]] = prop_value
+			return properties
+		
 		def _parse_properties(self, prop_file):
 			if prop_file is None:
 				return
 			prop_file = SqUtils.get_file(prop_file)
-			if not os.path.isfile(prop_file):
+			if not Archive.isfile(prop_file):
 				raise Exception('"%s" does not exist' % prop_file)
-			with open(prop_file, 'r') as f:
-				idx = 0
-				for line in f:
-					line = line.strip().split('=', 1)
-					parts = line[0].split('.')
-					if len(line) != 2 or len(parts) != 4: 
-						continue
-					bug_pattern = parts[2]
-					idx += 1
-					if not bug_pattern in self: 
+			for bug_pattern, (idx, fields) in SonarQube.Rules._read_properties(prop_file).items():
+				rule = self.get(bug_pattern)
+				if rule is None:
+					continue
+				if rule.properties_index == 0:
+					rule._setattr('properties_index', idx)
+				for prop_name, prop_value in fields.items():
+					if not prop_name in SonarQube.Rules.PROPERTY_FIELDS:
 						continue
-					rule = self[bug_pattern]
-					if rule.properties_index == 0:
-						rule._setattr('properties_index', idx)
-					prop_value = line[1].strip()
-					if len(prop_value) == 0:
+					current_value = getattr(rule, prop_name) or ''
+					if prop_value != current_value.strip():
+						rule._setattr(prop_name, prop_value)
+		
+		def _get_html_files(self, html_dir):
+			files = []
+			if _scandir is not None and not Archive.is_member(html_dir):
+				for entry in _scandir(html_dir):
+					bug_pattern, file_ext = os.path.splitext(entry.name)
+					if file_ext != '.html' or not bug_pattern in self:
 						continue
-					prop_name = parts[3].strip()
-					if not hasattr(rule, prop_name):
+					if entry.is_file():
+						files.append((bug_pattern, entry.path))
+			else:
+				for fn in Archive.listdir(html_dir):
+					bug_pattern, file_ext = os.path.splitext(fn)
+					if file_ext != '.html' or not bug_pattern in self:
 						continue
-					current_value = getattr(rule, prop_name).strip()
-					if len(current_value) == 0 or prop_value != current_value:
-						rule._setattr(prop_name, prop_value)
+					fp = os.path.join(html_dir, fn)
+					if Archive.isfile(fp):
+						files.append((bug_pattern, fp))
+			return [(self[bug_pattern], fp) for bug_pattern, fp in files if len(self[bug_pattern].description.strip()) == 0]
+		
+		@staticmethod
+		def _read_html(fp):
+			with Archive.open(fp, 'r') as f:
+				return f.read().strip()
 		
 		def _parse_html(self, html_dir):
 			if html_dir is None: 
 				return
 			html_dir = SqUtils.get_dir(html_dir)
-			for fn in os.listdir(html_dir):
-				fp = os.path.join(html_dir, fn)
-				if not os.path.isfile(fp):
-					continue
-				file_name, file_ext = os.path.splitext(fn)
-				if file_ext != '.html':
-					continue
-				bug_pattern = file_name
-				if not bug_pattern in self:
-					continue
-				rule = self[bug_pattern]
-				current_value = rule.description.strip()
-				if len(current_value) > 0:
-					continue
-				with open(fp, 'r') as f:
-					content = f.read().strip()
-					if len(content) > 0:
-						rule._setattr('description', content)
+			files = self._get_html_files(html_dir)
+			paths = [fp for rule, fp in files]
+			threads = SonarQube.Rules.HTML_THREADS
+			# archive members are read in archive order, tar archives can not seek back cheaply
+			if threads > 1 and len(paths) > threads and not Archive.is_member(html_dir):
+				from multiprocessing.pool import ThreadPool
+				pool = ThreadPool(threads)
+				try:
+					contents = pool.map(SonarQube.Rules._read_html, paths)
+				finally:
+					pool.close()
+					pool.join()
+			else:
+				contents = [SonarQube.Rules._read_html(fp) for fp in paths]
+			for (rule, fp), content in zip(files, contents):
+				if len(content) > 0:
+					rule._setattr('description', content)
+		
+		def _to_data(self):
+			data = []
+			for rule in sorted(self.values(), key=lambda r: r.pattern_index):
+				params = [(p.key, p.ptype, p.description, p.default_value) for p in rule.params.values()]
+				data.append((rule.key, rule.config_key, rule.priority, rule.status, rule.cardinality, rule.name, rule.description, rule.deprecated_by, rule.tags, params, rule.pattern_index, rule.properties_index))
+			return data
 		
 		@classmethod
-		def parse(cls, rules_xml, prop_file = None, html_dir = None):
+		def _from_data(cls, data):
+			rules = cls()
+			for key, config_key, priority, status, cardinality, name, description, deprecated_by, tags, params_data, pattern_index, properties_index in data:
+				rule = SonarQube.Rule(key, config_key, priority, status, cardinality, name, description)
+				params = {}
+				for param_data in params_data:
+					param = SonarQube.RuleParam(*param_data)
+					params[param.key] = param
+				rule._setattr('deprecated_by', deprecated_by)
+				rule._setattr('tags', tags)
+				rule._setattr('params', params)
+				rule._setattr('pattern_index', pattern_index)
+				rule._setattr('properties_index', properties_index)
+				rules[key] = rule
+			return rules
+		
+		@classmethod
+		@Stats.timed('sq.rules.parse')
+		def parse(cls, rules_xml, prop_file = None, html_dir = None, stream = False, cache = None):
 			rules_xml = SqUtils.get_file(rules_xml)
-			if not os.path.isfile(rules_xml):
+			if not Archive.isfile(rules_xml):
 				raise Exception('"%s" does not exist' % rules_xml)
-			xtree = etree.parse(rules_xml)
-			xroot = xtree.getroot()
+			
+			if cache is not None:
+				cache_key = cache.get_key('SonarQube.Rules', [rules_xml, prop_file, html_dir])
+				data = cache.load(cache_key)
+				if data is not None:
+					return cls._from_data(data)
 			
 			rules = cls()
-			for xrule in xroot.iterfind('rule'):
-				rule = SonarQube.Rule.parse(xrule)
-				if rule:
-					rules[rule.key] = rule
-			rules._parse_properties(prop_file)
-			rules._parse_html(html_dir)
+			if stream:
+				for position, xrule in SqXml.iter_children(Archive.get_source(rules_xml)):
+					if position == 0 or xrule.tag != 'rule':
+						continue
+					rule = SonarQube.Rule.parse(xrule, position)
+					if rule:
+						rules[rule.key] = rule
+			else:
+				xtree = etree.parse(Archive.get_source(rules_xml))
+				xroot = xtree.getroot()
+				for position, xrule in enumerate(xroot, 1):
+					if xrule.tag != 'rule':
+						continue
+					rule = SonarQube.Rule.parse(xrule, position, lazy=True)
+					if rule:
+						rules[rule.key] = rule
+			with Stats.phase('sq.rules.properties'):
+				rules._parse_properties(prop_file)
+			with Stats.phase('sq.rules.html'):
+				rules._parse_html(html_dir)
 			for rule in rules.values():
 				rule._update_properties()
+			
+			if cache is not None:
+				cache.store(cache_key, rules._to_data())
 			return rules
 	
 	class Rule(object):
+		__slots__ = ('__key', '__config_key', '__priority', '__status', '__cardinality', '__name', '__description', '__deprecated_by', '__tags', '__params', '__pattern_index', '__properties_index', '__xrule')
+		_ATTRS = dict((name, '_Rule__' + name) for name in ('key', 'config_key', 'priority', 'status', 'cardinality', 'name', 'description', 'deprecated_by', 'tags', 'params', 'pattern_index', 'properties_index'))
+		_RE_DEPRECATED_BY_TWO = re.compile('This rule is deprecated, use {rule:squid:([^}]*)} and {rule:squid:([^}]*)} instead.')
+		_RE_DEPRECATED_BY = re.compile('This rule is deprecated, use {rule:squid:([^}]*)} instead.')
+		
 		def __init__(self, key, config_key, priority, status, cardinality, name, description):
 			self.__key = key
 			self.__config_key = config_key if config_key else key
@@ -217,6 +424,7 @@ class SonarQube(object):
 			self.__params = {}
 			self.__pattern_index = 0
 			self.__properties_index = 0
+			self.__xrule = None
 		
 		@property
 		def key(self):
@@ -244,10 +452,15 @@ class SonarQube(object):
 		
 		@property
 		def description(self):
+			if self.__xrule is not None:
+				self.__description = SqXml.get_cnode_text(self.__xrule, 'description')
+				self.__xrule = None
 			return self.__description
 		
 		@property
 		def deprecated_by(self):
+			if self.__deprecated_by is None:
+				self.__deprecated_by = self._get_deprecated_by()
 			return self.__deprecated_by
 		
 		@property
@@ -267,26 +480,29 @@ class SonarQube(object):
 			return self.__properties_index
 		
 		def _setattr(self, attr_name, attr_value):
-			if hasattr(self, attr_name):
-				setattr(self, '_{0}__{1}'.format(self.__class__.__name__, attr_name), attr_value)
+			slot_name = SonarQube.Rule._ATTRS.get(attr_name)
+			if slot_name is not None:
+				setattr(self, slot_name, attr_value)
+				if attr_name == 'description':
+					self.__xrule = None
 		
 		def _update_properties(self):
-			prefix = 'This rule is deprecated, use '
-			postfix = ' instead.'
-			rule_pattern = '{rule:squid:([^}]*)}'
-			pattern = prefix + rule_pattern + ' and ' + rule_pattern + postfix
-			mx = re.search(pattern, self.description)
+			self.__deprecated_by = None
+		
+		def _get_deprecated_by(self):
+			deprecated_by = []
+			mx = SonarQube.Rule._RE_DEPRECATED_BY_TWO.search(self.description)
 			if mx is not None:
-				self.__deprecated_by.append(mx.group(1))
-				self.__deprecated_by.append(mx.group(2))
+				deprecated_by.append(mx.group(1))
+				deprecated_by.append(mx.group(2))
 			else:
-				pattern = prefix + rule_pattern + postfix
-				mx = re.search(pattern, self.description)
+				mx = SonarQube.Rule._RE_DEPRECATED_BY.search(self.description)
 				if mx is not None:
-					self.__deprecated_by.append(mx.group(1))
+					deprecated_by.append(mx.group(1))
+			return deprecated_by
 		
 		@classmethod
-		def parse(cls, xrule):
+		def parse(cls, xrule, pattern_index = 0, lazy = False):
 			key = SqXml.get_attr_value(xrule, 'key')
 			v = SqXml.get_cnode_text(xrule, 'key')
 			if v and not key: key = v
@@ -298,7 +514,7 @@ class SonarQube(object):
 			status = SqXml.get_cnode_text(xrule, 'status')
 			cardinality = SqXml.get_cnode_text(xrule, 'cardinality')
 			name = SqXml.get_cnode_text(xrule, 'name')
-			description = SqXml.get_cnode_text(xrule, 'description')
+			description = None if lazy else SqXml.get_cnode_text(xrule, 'description')
 			tags = []
 			for xtag in SqXml.get_nodes(xrule, 'tag'):
 				v = SqXml.get_node_text(xtag)
@@ -307,11 +523,14 @@ class SonarQube(object):
 			for xparam in SqXml.get_nodes(xrule, 'param'):
 				param = SonarQube.RuleParam.parse(xparam)
 				if param: params[param.key] = param
-			pattern_index = xrule.getparent().index(xrule)
+			if pattern_index == 0:
+				pattern_index = xrule.getparent().index(xrule) + 1
 			rule = cls(key, config_key, priority, status, cardinality, name, description)
 			rule.__tags = tags
 			rule.__params = params
-			rule.__pattern_index = pattern_index + 1
+			rule.__pattern_index = pattern_index
+			if lazy:
+				rule.__xrule = xrule
 			return rule
 		
 		def __repr__(self):
@@ -322,6 +541,8 @@ class SonarQube(object):
 			return "Rule(%s)" % attr
 	
 	class RuleParam(object):
+		__slots__ = ('__key', '__ptype', '__description', '__default_value')
+		
 		def __init__(self, key, ptype, description, default_value):
 			self.__key = key
 			self.__ptype = SonarQube.PropertyType.get(ptype)
@@ -361,42 +582,42 @@ class SonarQube(object):
 	class RulePriority(object):
 		DEFAULT = 'INFO'
 		ALL = ['BLOCKER', 'CRITICAL', 'MAJOR', 'MINOR', 'INFO']
+		LEVELS = dict((v, i) for i, v in enumerate(ALL))
 		
 		@classmethod
 		def get(cls, priority):
 			if priority is not None: 
-				priority = priority.upper()
-				if priority in cls.ALL:
-					return priority
+				level = cls.LEVELS.get(priority.upper())
+				if level is not None:
+					return cls.ALL[level]
 			return cls.DEFAULT
 		
 		@classmethod
 		def get_level(cls, priority):
-			try:
-				return cls.ALL.index(priority)
-			except:
-				priority = cls.get(priority)
-				return cls.get_level(priority)
+			level = cls.LEVELS.get(priority)
+			if level is None:
+				level = cls.LEVELS[cls.get(priority)]
+			return level
 	
 	class RuleStatus(object):
 		DEFAULT = 'READY'
 		ALL = ['READY', 'BETA', 'DEPRECATED', 'REMOVED']
+		LEVELS = dict((v, i) for i, v in enumerate(ALL))
 		
 		@classmethod
 		def get(cls, status):
 			if status is not None: 
-				status = status.upper()
-				if status in cls.ALL:
-					return status
+				level = cls.LEVELS.get(status.upper())
+				if level is not None:
+					return cls.ALL[level]
 			return cls.DEFAULT
 		
 		@classmethod
 		def get_level(cls, status):
-			try:
-				return cls.ALL.index(status)
-			except:
-				status = cls.get(status)
-				return cls.get_level(status)
+			level = cls.LEVELS.get(status)
+			if level is None:
+				level = cls.LEVELS[cls.get(status)]
+			return level
 
 	class PropertyType(object):
 		DEFAULT = 'STRING'
@@ -416,6 +637,41 @@ class SonarQube(object):
 					return ptype
 			return cls.DEFAULT
 	
+	class RuleKeys(dict):
+		"""Index of rule key -> [(plugin_id, file, position)].
+		
+		A key collides when it is defined by more than one plugin or more
+		than once in the same file; the same plugin's generated and source
+		rule sets may share keys.
+		"""
+		def add(self, key, plugin_id, file_name, position):
+			locations = self.get(key)
+			if locations is None:
+				self[key] = [(plugin_id, file_name, position)]
+			else:
+				locations.append((plugin_id, file_name, position))
+		
+		def add_rules(self, rules_xml, plugin_id = None):
+			rules_xml = SqUtils.get_file(rules_xml)
+			if plugin_id is None:
+				plugin_id = SonarQube.Rules.get_plugin_id(rules_xml)
+			count = 0
+			for position, key in SonarQube.Rules.iter_keys(rules_xml):
+				self.add(key, plugin_id, rules_xml, position)
+				count += 1
+			return count
+		
+		def get_duplicates(self):
+			duplicates = []
+			for key, locations in self.items():
+				if len(locations) < 2:
+					continue
+				plugin_ids = set(l[0] for l in locations)
+				file_names = set(l[1] for l in locations)
+				if len(plugin_ids) > 1 or len(file_names) < len(locations):
+					duplicates.append((key, locations))
+			return sorted(duplicates)
+	
 	class RulesProfile(dict):
 		def __init__(self, *args, **kwargs):
 			dict.__init__(self, *args, **kwargs)
@@ -425,14 +681,16 @@ class SonarQube(object):
 			return SonarQube.Rules.find_dir(plugin_dir)
 		
 		@classmethod
+		@Stats.timed('sq.profile.parse')
 		def parse(cls, profile_xml):
 			rules_xml = SqUtils.get_file(profile_xml)
-			if not os.path.isfile(rules_xml):
+			if not Archive.isfile(rules_xml):
 				raise Exception('"%s" does not exist' % profile_xml)
-			xtree = etree.parse(profile_xml)
+			xtree = etree.parse(Archive.get_source(rules_xml))
 			xroot = xtree.getroot()
 			
 			rules = cls()
+			Stats.count('xpath.evaluations')
 			for xbug in xtree.xpath('/FindBugsFilter/Match/Bug'):
 				bug_pattern = SqXml.get_attr_value(xbug, 'pattern')
 				if not bug_pattern: continue
@@ -441,6 +699,8 @@ class SonarQube(object):
 			return rules
 	
 	class RuleProfileItem(object):
+		__slots__ = ('__key', '__index')
+		
 		def __init__(self, key, index):
 			self.__key = key
 			self.__index = index
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import os, sys, time, json, threading, functools
+
+class Stats():
+	"""Per-phase timings and counters for a single run.
+	
+	Hooks call the static helpers (phase, timed, count, sample), which do
+	nothing until start() has made a Stats instance current. Counters for
+	precompiled XPath and regex objects are installed by start() and
+	removed by stop(), so hot loops carry no extra checks when disabled.
+	"""
+	current = None
+	
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._phases = {}
+		self._counters = {}
+		self._samples = {}
+		self._patched = []
+		self._started = (time.time(), Stats._cpu_time())
+	
+	@staticmethod
+	def _cpu_time():
+		if hasattr(time, 'process_time'):
+			return time.process_time()
+		return time.clock()
+	
+	@staticmethod
+	def start():
+		stats = Stats()
+		try:
+			import tracemalloc
+			tracemalloc.start()
+		except ImportError:
+			pass
+		from fb import FindBugsPlugin
+		from sq import SonarQube, SqUtils
+		from textutils import TextUtils
+		stats._instrument(FindBugsPlugin, '_XP_', 'xpath.evaluations')
+		stats._instrument(TextUtils, '_RE_', 'regex.calls')
+		stats._instrument(SonarQube.Rule, '_RE_', 'regex.calls')
+		stats._instrument(SqUtils, '_RE_', 'regex.calls')
+		Stats.current = stats
+		return stats
+	
+	@staticmethod
+	def stop():
+		stats = Stats.current
+		Stats.current = None
+		if stats is None:
+			return None
+		for owner, attr_name, value in stats._patched:
+			setattr(owner, attr_name, value)
+		stats._patched = []
+		report = stats.report()
+		try:
+			import tracemalloc
+			tracemalloc.stop()
+		except ImportError:
+			pass
+		return report
+	
+	def _instrument(self, owner, prefix, counter_name):
+		for attr_name in dir(owner):
+			if not attr_name.startswith(prefix):
+				continue
+			value = getattr(owner, attr_name)
+			self._patched.append((owner, attr_name, value))
+			setattr(owner, attr_name, Stats._Counted(value, self, counter_name))
+	
+	@staticmethod
+	def phase(name):
+		stats = Stats.current
+		if stats is None:
+			return Stats._NO_PHASE
+		return Stats._Phase(stats, name)
+	
+	@staticmethod
+	def timed(name):
+		def decorator(func):
+			@functools.wraps(func)
+			def wrapper(*args, **kwargs):
+				if Stats.current is None:
+					return func(*args, **kwargs)
+				with Stats.phase(name):
+					return func(*args, **kwargs)
+			return wrapper
+		return decorator
+	
+	@staticmethod
+	def count(name, value = 1):
+		stats = Stats.current
+		if stats is not None:
+			stats._add(name, value)
+	
+	@staticmethod
+	def sample(name, value):
+		stats = Stats.current
+		if stats is not None:
+			with stats._lock:
+				stats._samples.setdefault(name, []).append(value)
+	
+	def _add(self, name, value):
+		with self._lock:
+			self._counters[name] = self._counters.get(name, 0) + value
+	
+	def _add_phase(self, name, wall, cpu):
+		with self._lock:
+			phase = self._phases.setdefault(name, [0, 0.0, 0.0])
+			phase[0] += 1
+			phase[1] += wall
+			phase[2] += cpu
+	
+	@staticmethod
+	def _percentile(values, percent):
+		index = int(round(percent / 100.0 * (len(values) - 1)))
+		return values[index]
+	
+	@staticmethod
+	def get_peak_rss():
+		try:
+			import resource
+		except ImportError:
+			return None
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		if sys.platform == 'darwin':
+			peak //= 1024
+		return peak
+	
+	def report(self):
+		phases = {}
+		for name, (calls, wall, cpu) in self._phases.items():
+			phases[name] = {'calls': calls, 'wall': round(wall, 6), 'cpu': round(cpu, 6)}
+		latencies = {}
+		for name, values in self._samples.items():
+			values = sorted(values)
+			latencies[name] = {
+				'count': len(values),
+				'p50': round(Stats._percentile(values, 50), 6),
+				'p90': round(Stats._percentile(values, 90), 6),
+				'p99': round(Stats._percentile(values, 99), 6),
+				'max': round(values[-1], 6)
+			}
+		memory = {'peak_rss_kb': Stats.get_peak_rss(), 'tracemalloc_peak': None}
+		try:
+			import tracemalloc
+			if tracemalloc.is_tracing():
+				memory['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+		except ImportError:
+			pass
+		started_wall, started_cpu = self._started
+		return {
+			'wall': round(time.time() - started_wall, 6),
+			'cpu': round(Stats._cpu_time() - started_cpu, 6),
+			'phases': phases,
+			'counters': dict(self._counters),
+			'latency': latencies,
+			'memory': memory
+		}
+	
+	@staticmethod
+	def write(report, fh = None):
+		fh = fh or sys.stderr
+		fh.write(json.dumps(report, indent=1, sort_keys=True, separators=(',', ': ')))
+		fh.write('\n')
+	
+	@staticmethod
+	def profile(func, profile_file, *args, **kwargs):
+		"""Runs func under cProfile and dumps the statistics to profile_file."""
+		import cProfile
+		profiler = cProfile.Profile()
+		try:
+			return profiler.runcall(func, *args, **kwargs)
+		finally:
+			profiler.dump_stats(profile_file)
+	
+	class _Phase():
+		def __init__(self, stats, name):
+			self.stats = stats
+			self.name = name
+		
+		def __enter__(self):
+			self.started = (time.time(), Stats._cpu_time())
+			return self
+		
+		def __exit__(self, exc_type, exc_value, exc_tb):
+			wall, cpu = self.started
+			self.stats._add_phase(self.name, time.time() - wall, Stats._cpu_time() - cpu)
+	
+	class _NoPhase():
+		def __enter__(self):
+			return self
+		
+		def __exit__(self, exc_type, exc_value, exc_tb):
+			pass
+	
+	class _Counted():
+		"""Proxy that counts calls to a precompiled XPath or regex object."""
+		def __init__(self, target, stats, name):
+			self._target = target
+			self._stats = stats
+			self._name = name
+		
+		def __call__(self, *args, **kwargs):
+			self._stats._add(self._name, 1)
+			return self._target(*args, **kwargs)
+		
+		def __getattr__(self, attr_name):
+			value = getattr(self._target, attr_name)
+			if not callable(value):
+				return value
+			def counted(*args, **kwargs):
+				self._stats._add(self._name, 1)
+				return value(*args, **kwargs)
+			return counted
+
+Stats._NO_PHASE = Stats._NoPhase()
@@ -0,0 +1,24 @@
+import os, sys, glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from cache import ParseCache
+
+def cache_size(cache_dir):
+	return sum(os.path.getsize(f) for f in glob.glob(os.path.join(cache_dir, '*' + ParseCache.SUFFIX)))
+
+def test_full_cache_evicts_to_low_water(tmp_path):
+	cache_dir = str(tmp_path)
+	cache = ParseCache(cache_dir, 100 * 1024)
+	evict = cache._evict
+	scans = []
+	def counting_evict():
+		scans.append(True)
+		evict()
+	cache._evict = counting_evict
+	for i in range(300):
+		assert cache.store(cache.get_data_key('test', [str(i)]), os.urandom(1000))
+		assert cache_size(cache_dir) <= cache.max_size
+	# one scan per store once full without the low-water mark
+	assert len(scans) <= 30
+	assert cache.load(cache.get_data_key('test', ['299'])) is not None
+	assert cache.load(cache.get_data_key('test', ['0'])) is None
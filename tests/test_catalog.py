@@ -0,0 +1,60 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from catalog import RuleCatalog
+from benchmark.generate import SyntheticPlugin
+
+def touch(path, data):
+	with open(path, 'ab') as fh:
+		fh.write(data)
+
+def imported(tmp_path):
+	plugin = SyntheticPlugin(str(tmp_path / 'plugin'), 20).write()
+	catalog = RuleCatalog(str(tmp_path / 'catalog.db'))
+	catalog.import_plugin(plugin.etc_dir)
+	catalog.import_rules(plugin.rules_xml, plugin.properties_file, plugin.html_dir)
+	catalog.import_profile(plugin.profile_xml)
+	catalog.import_data_file(plugin.data_file)
+	return plugin, catalog
+
+def test_unchanged_sources_are_served(tmp_path, capsys):
+	plugin, catalog = imported(tmp_path)
+	assert len(catalog.load_plugin(plugin.etc_dir).patterns) == 20
+	assert catalog.load_rules(plugin.rules_xml) is not None
+	assert catalog.load_profile(plugin.profile_xml) is not None
+	assert catalog.load_data_file(plugin.data_file) is not None
+	assert capsys.readouterr().err == ''
+
+def test_touched_sources_are_served(tmp_path, capsys):
+	plugin, catalog = imported(tmp_path)
+	messages_xml = os.path.join(plugin.etc_dir, 'messages.xml')
+	mtime = os.path.getmtime(messages_xml) + 10
+	os.utime(messages_xml, (mtime, mtime))
+	os.utime(plugin.data_file, (mtime, mtime))
+	assert catalog.load_plugin(plugin.etc_dir) is not None
+	assert catalog.load_data_file(plugin.data_file) is not None
+	assert capsys.readouterr().err == ''
+
+def test_changed_plugin_is_not_served(tmp_path, capsys):
+	plugin, catalog = imported(tmp_path)
+	touch(os.path.join(plugin.etc_dir, 'messages.xml'), b'\n')
+	assert catalog.load_plugin(plugin.etc_dir) is None
+	assert 'changed since it was imported' in capsys.readouterr().err
+	catalog.import_plugin(plugin.etc_dir)
+	assert catalog.load_plugin(plugin.etc_dir) is not None
+
+def test_changed_rule_inputs_are_not_served(tmp_path, capsys):
+	plugin, catalog = imported(tmp_path)
+	touch(plugin.properties_file, b'\n')
+	assert catalog.load_rules(plugin.rules_xml) is None
+	assert catalog.load_profile(plugin.profile_xml) is not None
+	html_file = os.path.join(plugin.html_dir, sorted(os.listdir(plugin.html_dir))[0])
+	catalog.import_rules(plugin.rules_xml, plugin.properties_file, plugin.html_dir)
+	touch(html_file, b'\n')
+	assert catalog.load_rules(plugin.rules_xml) is None
+	assert 'changed since it was imported' in capsys.readouterr().err
+
+def test_changed_data_file_is_not_served(tmp_path):
+	plugin, catalog = imported(tmp_path)
+	touch(plugin.data_file, b'# more\n')
+	assert catalog.load_data_file(plugin.data_file) is None
@@ -0,0 +1,28 @@
+import os, sys, glob, argparse
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fb2sq import Converter
+from benchmark.generate import SyntheticPlugin
+
+def convert(plugin, output_dir, html):
+	args = argparse.Namespace(html=html, tidy=False, stream=False, cache_dir=None, cache_size=64,
+	                          exclude=None, comment=None, incremental=True, jobs=1, db=None, archive=None)
+	Converter(args, output_dir).convert(plugin.data_file, plugin.etc_dir)
+
+def html_files(output_dir):
+	return sorted(os.path.basename(f) for f in glob.glob(os.path.join(output_dir, 'html', 'findbugs', '*.html')))
+
+@pytest.mark.skipif(sys.version_info[0] > 2, reason='conversion requires Python 2')
+def test_incremental_without_html_keeps_html(tmp_path):
+	plugin = SyntheticPlugin(str(tmp_path / 'plugin'), 30).write()
+	output_dir = str(tmp_path / 'build')
+	convert(plugin, output_dir, html=True)
+	written = html_files(output_dir)
+	assert len(written) == 30
+	convert(plugin, output_dir, html=False)
+	assert html_files(output_dir) == written
+	# the manifest still knows them, so a later --html -i run renders nothing new
+	mtimes = [os.path.getmtime(os.path.join(output_dir, 'html', 'findbugs', name)) for name in written]
+	convert(plugin, output_dir, html=True)
+	assert [os.path.getmtime(os.path.join(output_dir, 'html', 'findbugs', name)) for name in written] == mtimes
@@ -0,0 +1,37 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from fb2sq import OrderedOutput
+
+def emitted(records):
+	output = OrderedOutput()
+	for order, key in records:
+		output.add(order, key)
+	return list(output)
+
+def test_sparse_orders():
+	records = [(10 ** 9, 'C'), (1, 'A'), (10 ** 6, 'B')]
+	assert emitted(records) == ['A', 'B', 'C']
+
+def test_sparse_orders_large_gaps_keep_size():
+	output = OrderedOutput()
+	for order, key in [(10 ** 9, 'C'), (1, 'A'), (10 ** 6, 'B')]:
+		output.add(order, key)
+	assert len(output) == 3
+	assert list(output) == ['A', 'B', 'C']
+
+def test_zero_orders_go_last_in_insertion_order():
+	records = [(0, 'Z1'), (2, 'B'), (0, 'Z2'), (1, 'A'), (0, 'Z3')]
+	assert emitted(records) == ['A', 'B', 'Z1', 'Z2', 'Z3']
+
+def test_negative_orders_are_not_emitted():
+	records = [(-1, 'X'), (1, 'A'), (-10 ** 9, 'Y'), (0, 'Z')]
+	assert emitted(records) == ['A', 'Z']
+
+def test_duplicate_orders_keep_insertion_order():
+	records = [(5, 'B1'), (3, 'A'), (5, 'B2'), (10 ** 6, 'C'), (5, 'B3')]
+	assert emitted(records) == ['A', 'B1', 'B2', 'B3', 'C']
+
+def test_mixed():
+	records = [(0, 'Z'), (10 ** 9, 'D'), (-1, 'X'), (1, 'A1'), (10 ** 6, 'C'), (1, 'A2'), (0, 'Z2'), (2, 'B')]
+	assert emitted(records) == ['A1', 'A2', 'B', 'C', 'D', 'Z', 'Z2']
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from sq import SqUtils, SonarQube
+
+def parse(data):
+	return list(SqUtils.iter_properties(data.splitlines(True)))
+
+def test_unicode_escapes():
+	assert parse(b'a=caf\\u00e9 \\u20AC\n') == [(u'a', u'caf\xe9 \u20ac')]
+	assert parse(b'k\\u0041y=v\n') == [(u'kAy', u'v')]
+
+def test_other_escapes():
+	assert parse(b'a=tab\\there\\nnew \\\\ \\=\\q\n') == [(u'a', u'tab\there\nnew \\ =q')]
+
+def test_continuation_lines():
+	data = b'a=one \\\n    two \\\n\tthree\nb=x\n'
+	assert parse(data) == [(u'a', u'one two three'), (u'b', u'x')]
+
+def test_even_backslashes_do_not_continue():
+	assert parse(b'a=x\\\\\nb=y\n') == [(u'a', u'x\\'), (u'b', u'y')]
+
+def test_continuation_at_end_of_file():
+	assert parse(b'a=one \\\n') == [(u'a', u'one ')]
+
+def test_separators():
+	data = b'a=1\nb:2\nc 3\nd\t =  4\ne :5\nf\ng=\n'
+	assert parse(data) == [(u'a', u'1'), (u'b', u'2'), (u'c', u'3'), (u'd', u'4'), (u'e', u'5'), (u'f', u''), (u'g', u'')]
+
+def test_escaped_separators_in_key():
+	assert parse(b'a\\:b\\ c=d\n') == [(u'a:b c', u'd')]
+
+def test_comments_and_blank_lines():
+	data = b'# comment=1\n! other=2\n\n   \n  # indented\na=1\n'
+	assert parse(data) == [(u'a', u'1')]
+
+def test_mixed_bytes_and_escapes():
+	# raw bytes are ISO 8859-1, like java.util.Properties.load(InputStream)
+	assert parse(b'rule.findbugs.B.name=\xc3\xa9 and \\u00e9\n') == [(u'rule.findbugs.B.name', u'\xc3\xa9 and \xe9')]
+	assert parse(b'\xe9=\xe9\n') == [(u'\xe9', u'\xe9')]
+
+def test_text_lines():
+	assert list(SqUtils.iter_properties([u'a=\xe9\n'])) == [(u'a', u'\xe9')]
+
+def test_properties_index_skips_comments(tmp_path):
+	prop_file = tmp_path / 'findbugs.properties'
+	prop_file.write_bytes(b'#rule.findbugs.X.name=commented out\n'
+	                      b'rule.findbugs.A.name=A \\\n'
+	                      b'  rule.findbugs.Y.name=continued\n'
+	                      b'rule.findbugs.B.name=B\n'
+	                      b'rule.findbugs.A.description=\n')
+	properties = SonarQube.Rules._read_properties(str(prop_file))
+	assert properties == {u'A': (1, {u'name': u'A rule.findbugs.Y.name=continued'}), u'B': (2, {u'name': u'B'})}
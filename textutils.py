@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+   The MIT License (MIT)
+   
+   Copyright (C) 2015 Andris Raugulis (moo@arthepsy.eu)
+   
+   Permission is hereby granted, free of charge, to any person obtaining a copy
+   of this software and associated documentation files (the "Software"), to deal
+   in the Software without restriction, including without limitation the rights
+   to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+   copies of the Software, and to permit persons to whom the Software is
+   furnished to do so, subject to the following conditions:
+   
+   The above copyright notice and this permission notice shall be included in
+   all copies or substantial portions of the Software.
+   
+   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+   AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+   OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+   THE SOFTWARE.
+"""
+import re
+
+class TextUtils():
+	"""Whitespace helpers for descriptions and cleaned text.
+	
+	Every helper is a single scan with a precompiled pattern, so the cost is
+	linear in the text length even for long runs of blanks.
+	"""
+	_RE_SPACES = re.compile(r'[\n\t\s]+')
+	# the lookbehind starts a match only at the first blank of a run, without it a long run is quadratic
+	_RE_TRAILING = re.compile(r'(?<![\t ])[\t ]+\n')
+	_RE_PARAGRAPH = re.compile(r'[ ]+<p>')
+	_RE_INDENT = re.compile(r'^(\t*)[^\t\n]', re.M)
+	
+	@staticmethod
+	def get_clean(text):
+		return TextUtils._RE_SPACES.sub(' ', text).strip()
+	
+	@staticmethod
+	def strip_trailing(text):
+		if not ' \n' in text and not '\t\n' in text:
+			return text
+		return TextUtils._RE_TRAILING.sub('\n', text)
+	
+	@staticmethod
+	def get_indent(text):
+		"""Return the smallest number of leading tabs over lines with other content."""
+		tabs = -1
+		for mx in TextUtils._RE_INDENT.finditer(text):
+			n = len(mx.group(1))
+			if tabs == -1 or n < tabs:
+				tabs = n
+				if tabs == 0: break
+		return tabs
+	
+	@staticmethod
+	def dedent(html):
+		mx = TextUtils._RE_PARAGRAPH.match(html)
+		if mx is not None:
+			html = '<p>' + html[mx.end():]
+		tabs = TextUtils.get_indent(html)
+		if tabs > 0:
+			html = html.replace('\t' * tabs, '')
+		return html